@@ -0,0 +1,76 @@
+"""
+Measures encode time and payload size of every output encoder on the same
+set of rendered canvases, and whether the output is pixel-exact.
+
+Usage: python benchmarks/encoder_benchmark.py [--repeat 3]
+"""
+import argparse
+import io
+import os
+import statistics
+import sys
+import time
+
+from PIL import Image
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.utils import localization
+from src.utils import image_generator as ig
+from src.utils.image_encoder import ImageEncoder
+
+ENCODERS = [
+    ImageEncoder("png", palette=False, compress_level=6),
+    ImageEncoder("png", palette=False, compress_level=1),
+    ImageEncoder("png", palette=True, compress_level=6),
+    ImageEncoder("png", palette=True, compress_level=9),
+    ImageEncoder("png", palette=True, compress_level=1),
+    ImageEncoder("webp", quality=100),
+    ImageEncoder("webp", quality=90),
+    ImageEncoder("webp", quality=75),
+    ImageEncoder("jpeg", quality=90),
+    ImageEncoder("jpeg", quality=75),
+]
+
+
+def build_canvases(locales: dict, quotes: dict) -> list:
+    """Returns (rgb, palette) canvas pairs for a spread of languages and ages."""
+    canvases = []
+    for lang_code in ("en", "ru", "uz", "uz_cyrl"):
+        for weeks_passed in (100, 1500, 3000, 4500):
+            quote = quotes[lang_code][weeks_passed % len(quotes[lang_code])]
+            pair = []
+            for palette in (False, True):
+                img = ig.get_base_layer(lang_code, locales, palette=palette).copy()
+                ig._paint_grid(img, weeks_passed)
+                ig._draw_quote(img, quote, ig.DEFAULT_FONT_PATH, ig.get_base_layer(lang_code, locales))
+                pair.append(img)
+            canvases.append(tuple(pair))
+    return canvases
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    locales, quotes = localization.load_locales()
+    canvases = build_canvases(locales, quotes)
+
+    print(f"{'encoder':<16} {'encode ms':>10} {'avg KB':>8} {'exact':>6}")
+    for encoder in ENCODERS:
+        timings, sizes, exact = [], [], True
+        for rgb, palette in canvases:
+            img = palette if encoder.palette else rgb
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                data = encoder.encode(img)
+                timings.append((time.perf_counter() - start) * 1000)
+            sizes.append(len(data))
+            decoded = Image.open(io.BytesIO(data)).convert("RGB")
+            exact = exact and decoded.tobytes() == rgb.tobytes()
+        print(f"{encoder.signature:<16} {statistics.median(timings):>10.1f} {statistics.mean(sizes) / 1024:>8.1f} {'yes' if exact else 'no':>6}")
+
+
+if __name__ == "__main__":
+    main()
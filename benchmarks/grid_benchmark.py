@@ -0,0 +1,83 @@
+"""
+Compares the per-cell `draw.rectangle` grid loop with the tile-run painter
+used by `generate_life_table_image`, and checks both produce the same pixels.
+
+Usage: python benchmarks/grid_benchmark.py [--repeat 20]
+"""
+import argparse
+import os
+import sys
+import time
+
+from PIL import ImageDraw
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.utils import localization
+from src.utils import image_generator as ig
+from src.utils.life_grid import LIFE_STAGE_WEEKS
+
+
+def paint_grid_per_cell(img, weeks_passed: int) -> None:
+    """The original grid loop: one rectangle call and one Python colour lookup per cell."""
+    draw = ImageDraw.Draw(img)
+    for year in range(ig.COLS):
+        for week_of_year in range(ig.ROWS):
+            x = ig.MARGIN["left"] + year * ig.CELL_PITCH_X
+            y = ig.MARGIN["top"] + week_of_year * ig.CELL_PITCH_Y
+            current_week_index = year * ig.ROWS + week_of_year
+
+            fill_color = ig.COLORS["future"]
+            if current_week_index == weeks_passed:
+                fill_color = ig.COLORS["current_week"]
+            elif current_week_index < weeks_passed:
+                if current_week_index < LIFE_STAGE_WEEKS["childhood_adolescence"]:
+                    fill_color = ig.COLORS["childhood_adolescence"]
+                elif current_week_index < LIFE_STAGE_WEEKS["young_adulthood"]:
+                    fill_color = ig.COLORS["young_adulthood"]
+                elif current_week_index < LIFE_STAGE_WEEKS["middle_age"]:
+                    fill_color = ig.COLORS["middle_age"]
+                else:
+                    fill_color = ig.COLORS["seniority"]
+
+            draw.rectangle([x, y, x + ig.BOX_SIZE, y + ig.BOX_SIZE], fill=fill_color, outline=ig.COLORS["outline"], width=1)
+
+
+def time_painter(painter, base, weeks: list, repeat: int) -> float:
+    """Returns the mean time in milliseconds to paint one grid (canvas copy included)."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for weeks_passed in weeks:
+            painter(base.copy(), weeks_passed)
+    return (time.perf_counter() - start) * 1000 / (repeat * len(weeks))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    locales, _ = localization.load_locales()
+    base = ig.get_base_layer("en", locales)
+    weeks = [0, 500, 1500, 2500, 3500, 4679, 5000]
+
+    for weeks_passed in weeks:
+        expected, actual = base.copy(), base.copy()
+        paint_grid_per_cell(expected, weeks_passed)
+        ig._paint_grid(actual, weeks_passed)
+        if expected.tobytes() != actual.tobytes():
+            print(f"Pixel mismatch at weeks_passed={weeks_passed}")
+            sys.exit(1)
+
+    ig._paint_grid(base.copy(), 0)  # build the tile and lived-layer caches outside the timed loop
+    per_cell_ms = time_painter(paint_grid_per_cell, base, weeks, args.repeat)
+    tiled_ms = time_painter(ig._paint_grid, base, weeks, args.repeat)
+
+    print(f"Output identical for {len(weeks)} weeks_passed values.")
+    print(f"draw.rectangle per cell: {per_cell_ms:8.2f} ms/render")
+    print(f"Tile-run painter:        {tiled_ms:8.2f} ms/render")
+    print(f"Speedup:                 {per_cell_ms / tiled_ms:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Measures peak memory of batch renders at several concurrency levels, and how
+much the encode step allocates beyond the encoded image itself.
+
+Every concurrency level runs in a fresh child process, so its peak RSS is not
+inflated by the levels before it. The tracemalloc peak covers Python objects
+and NumPy arrays, not Pillow's own image buffers; peak RSS covers everything
+in the parent process, and with --workers > 0 the largest worker is reported too.
+
+Usage: python benchmarks/memory_benchmark.py [--images 64] [--concurrency 1 4 16 64] [--workers 0]
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import tracemalloc
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.utils import localization
+from src.utils import image_generator as ig
+from src.utils.image_encoder import encoder
+from src.utils.render_cache import render_cache
+
+
+def max_rss_mb(who: int = resource.RUSAGE_SELF) -> float:
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return resource.getrusage(who).ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def encode_overhead(locales: dict, quotes: dict) -> tuple:
+    """Returns (output bytes, bytes allocated at the peak of the encode step)."""
+    img = ig.get_base_layer("en", locales, palette=encoder.palette).copy()
+    ig._paint_grid(img, 1500)
+    ig._draw_quote(img, quotes["en"][0], ig.DEFAULT_FONT_PATH, ig.get_base_layer("en", locales))
+    encoder.encode(img)  # the first encode also pays one-time plugin setup
+    tracemalloc.start()
+    data = encoder.encode(img)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return len(data), peak
+
+
+async def render_batch(images: int, concurrency: int, workers: int, locales: dict, quotes: dict) -> dict:
+    from src.utils.render_service import RenderService
+
+    service = RenderService(workers, concurrency, batch_size=1)
+    langs = list(locales.get("languages", {"en": "English"}))
+    specs = [
+        ig.RenderSpec(langs[i % len(langs)], 100 + i * 70, quotes[langs[i % len(langs)]][0], i)
+        for i in range(images)
+    ]
+    # Build the shared layers before measuring, they are a one-time cost of every process.
+    for lang_code in langs:
+        ig.render_life_table(0, lang_code, locales, "")
+    rss_before = max_rss_mb()
+
+    tracemalloc.start()
+    bytes_out = 0
+    async for _, group, image_bytes in service.render_many(specs):
+        bytes_out += len(image_bytes) * len(group)
+    traced_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    if service._executor is not None:
+        # Wait for the workers to exit, RUSAGE_CHILDREN only counts reaped processes
+        service._executor.shutdown(wait=True)
+    service.shutdown()
+    return {
+        "traced_peak_kb": traced_peak / 1024,
+        "rss_before_mb": rss_before,
+        "rss_peak_mb": max_rss_mb(),
+        "worker_rss_peak_mb": max_rss_mb(resource.RUSAGE_CHILDREN),
+        "bytes_out": bytes_out,
+    }
+
+
+def child(args) -> None:
+    localization.LOCALES, localization.QUOTES = locales, quotes = localization.load_locales()
+    render_cache.max_bytes = 0  # measure renders, not the cache
+    result = asyncio.run(render_batch(args.images, args.child, args.workers, locales, quotes))
+    print(json.dumps(result))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=64, help="distinct images per batch")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--workers", type=int, default=0, help="render processes, 0 renders in threads")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args)
+        return
+
+    locales, quotes = localization.load_locales()
+    size, peak = encode_overhead(locales, quotes)
+    print(f"encoder {encoder.signature}: {size / 1024:.1f} KB out, {peak / 1024:.1f} KB allocated at the encode peak")
+    print()
+    print(f"{args.images} images, {args.workers} worker process(es)")
+    print(f"{'in flight':>9} {'traced KB':>10} {'traced/img':>11} {'RSS MB':>7} {'RSS +MB':>8} {'worker MB':>10} {'MB out':>7}")
+    for concurrency in args.concurrency:
+        output = subprocess.run(
+            [sys.executable, __file__, "--child", str(concurrency),
+             "--images", str(args.images), "--workers", str(args.workers)],
+            capture_output=True, text=True, check=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(
+            f"{concurrency:>9} {result['traced_peak_kb']:>10.0f} {result['traced_peak_kb'] / concurrency:>11.0f}"
+            f" {result['rss_peak_mb']:>7.0f} {result['rss_peak_mb'] - result['rss_before_mb']:>8.1f}"
+            f" {result['worker_rss_peak_mb']:>10.0f} {result['bytes_out'] / (1024 * 1024):>7.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
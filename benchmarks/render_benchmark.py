@@ -0,0 +1,180 @@
+"""
+Benchmarks the life-table renderer: cold and warm render time per language,
+encode time, peak memory and output size across a sweep of weeks_passed.
+
+Results are compared against benchmarks/render_baseline.json; a metric that
+got worse by more than the tolerance (timings are compared through their
+per-language median over the sweep) is reported as a regression and the
+script exits with status 1. Timings depend on the machine, so save a fresh
+baseline on the machine that runs the comparison.
+
+Usage: python benchmarks/render_benchmark.py [--repeat 5] [--tolerance 0.25]
+                                             [--languages en ru] [--save-baseline]
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import statistics
+import sys
+import time
+import tracemalloc
+
+import PIL
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.utils import localization
+from src.utils import fonts
+from src.utils import image_generator as ig
+from src.utils import life_grid
+from src.utils.image_encoder import encoder
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "render_baseline.json")
+WEEKS_SWEEP = (0, 1, 520, 1560, 2600, 3640, 4679, 4680)
+
+COLD_REPEAT = 3
+
+# Sizes are deterministic, so any growth beyond this counts as a regression.
+SIZE_TOLERANCE = 0.01
+
+
+def clear_render_state() -> None:
+    """Drops every lazily built renderer cache, so the next render starts cold."""
+    ig.clear_base_layers()
+    ig._GRID_LAYERS.clear()
+    ig._CELL_TILES.clear()
+    ig._quote_layout.cache_clear()
+    life_grid.packed_grid.cache_clear()
+    fonts.clear_fonts()
+
+
+def timed(func, *args) -> tuple:
+    start = time.perf_counter()
+    result = func(*args)
+    return (time.perf_counter() - start) * 1000, result
+
+
+def run(languages: list, repeat: int, locales: dict, quotes: dict) -> dict:
+    """Returns a flat {metric_name: value} dict."""
+    metrics = {}
+    # Untimed warm-up, so imports and first-use costs do not land on the first language
+    ig.render_life_table(0, languages[0], locales, "")
+
+    for lang_code in languages:
+        quote = ig._lang_quotes(quotes, lang_code)[0]
+
+        cold = []
+        for _ in range(COLD_REPEAT):
+            clear_render_state()
+            cold.append(timed(ig.render_life_table, 0, lang_code, locales, quote)[0])
+        metrics[f"{lang_code}/cold_ms"] = statistics.median(cold)
+
+        tracemalloc.start()
+        for weeks_passed in WEEKS_SWEEP:
+            prefix = f"{lang_code}/w{weeks_passed}"
+            renders = [timed(ig.render_life_table, weeks_passed, lang_code, locales, quote) for _ in range(repeat)]
+            metrics[f"{prefix}/warm_ms"] = statistics.median(ms for ms, _ in renders)
+            metrics[f"{prefix}/bytes"] = len(renders[0][1])
+
+            img = ig.get_base_layer(lang_code, locales, palette=encoder.palette).copy()
+            ig._paint_grid(img, weeks_passed)
+            ig._draw_quote(img, quote, ig.DEFAULT_FONT_PATH, ig.get_base_layer(lang_code, locales))
+            metrics[f"{prefix}/encode_ms"] = statistics.median(timed(encoder.encode, img)[0] for _ in range(repeat))
+        metrics[f"{lang_code}/peak_kb"] = tracemalloc.get_traced_memory()[1] / 1024
+        tracemalloc.stop()
+        for step in ("warm_ms", "encode_ms"):
+            metrics[f"{lang_code}/{step}"] = statistics.median(
+                metrics[f"{lang_code}/w{weeks_passed}/{step}"] for weeks_passed in WEEKS_SWEEP
+            )
+
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    metrics["process/max_rss_mb"] = max_rss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+    return metrics
+
+
+def compare(metrics: dict, baseline: dict, tolerance: float) -> list:
+    """
+    Returns (name, baseline, current, change) for every metric that regressed.
+    Single-render timings are too noisy to compare, timings are compared through
+    the per-language medians over the sweep instead.
+    """
+    regressions = []
+    for name, value in sorted(metrics.items()):
+        previous = baseline.get(name)
+        if not previous or ("/w" in name and name.endswith("_ms")):
+            continue
+        allowed = SIZE_TOLERANCE if name.endswith("/bytes") else tolerance
+        change = (value - previous) / previous
+        if change > allowed:
+            regressions.append((name, previous, value, change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slowdown of timings and memory")
+    parser.add_argument("--languages", nargs="+", help="defaults to every language in locales.json")
+    parser.add_argument("--save-baseline", action="store_true", help=f"write the results to {BASELINE_PATH}")
+    args = parser.parse_args()
+
+    locales, quotes = localization.load_locales()
+    languages = args.languages or list(locales.get("languages", {"en": "English"}))
+    metrics = run(languages, args.repeat, locales, quotes)
+
+    print(f"encoder {encoder.signature}, {args.repeat} repeats")
+    print(f"{'language':<9} {'cold ms':>8} {'peak KB':>8}   {'weeks':>6} {'warm ms':>8} {'encode ms':>10} {'KB out':>7}")
+    for lang_code in languages:
+        for i, weeks_passed in enumerate(WEEKS_SWEEP):
+            prefix = f"{lang_code}/w{weeks_passed}"
+            head = (
+                f"{lang_code:<9} {metrics[f'{lang_code}/cold_ms']:>8.1f} {metrics[f'{lang_code}/peak_kb']:>8.0f}"
+                if i == 0 else " " * 27
+            )
+            print(
+                f"{head}   {weeks_passed:>6} {metrics[f'{prefix}/warm_ms']:>8.1f}"
+                f" {metrics[f'{prefix}/encode_ms']:>10.1f} {metrics[f'{prefix}/bytes'] / 1024:>7.1f}"
+            )
+        print(
+            f"{'':<27}   {'median':>6} {metrics[f'{lang_code}/warm_ms']:>8.1f}"
+            f" {metrics[f'{lang_code}/encode_ms']:>10.1f}"
+        )
+    print(f"max RSS {metrics['process/max_rss_mb']:.0f} MB")
+
+    if args.save_baseline:
+        with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+            json.dump({
+                "environment": {
+                    "python": platform.python_version(),
+                    "pillow": PIL.__version__,
+                    "machine": platform.machine(),
+                    "encoder": encoder.signature,
+                },
+                "metrics": {name: round(value, 2) for name, value in metrics.items()},
+            }, f, indent=2)
+            f.write("\n")
+        print(f"Baseline saved to {BASELINE_PATH}")
+        return
+
+    if not os.path.exists(BASELINE_PATH):
+        print("No baseline to compare against, run with --save-baseline first.")
+        return
+    with open(BASELINE_PATH, encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get("environment", {}).get("encoder") != encoder.signature:
+        print(f"Baseline was recorded with encoder {baseline['environment'].get('encoder')}, sizes are not comparable.")
+    regressions = compare(metrics, baseline.get("metrics", {}), args.tolerance)
+    if not regressions:
+        print("No regressions against the baseline.")
+        return
+    print(f"{len(regressions)} regression(s) against the baseline:")
+    for name, previous, value, change in regressions:
+        print(f"  {name:<28} {previous:>10.2f} -> {value:>10.2f} ({change:+.0%})")
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
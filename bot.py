@@ -13,7 +13,8 @@ from telegram.ext import (
     filters,
     ContextTypes,
 )
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, render_template, request
+import hmac
 import threading
 import time as time_module
 import asyncio
@@ -21,6 +22,7 @@ import asyncio
 from src.database.sqlite_persistence import SQLitePersistence
 from src.database.database import init_database
 from src.database.user_repository import UserRepository
+from src.database.stats_repository import StatsRepository
 from src.utils import localization
 
 # --- Load locales first, before other modules that depend on them ---
@@ -36,9 +38,15 @@ except Exception as e:
     localization.QUOTES = {"uz": ["Vaqt o'tmoqda"], "ru": ["Время идет"], "en": ["Time is passing"]}
 
 # --- Now import other modules ---
-from src.config import TELEGRAM_TOKEN, ADMIN_ID
+from src.config import TELEGRAM_TOKEN, ADMIN_ID, METRICS_TOKEN
 from src.handlers import admin, commands, callbacks
-from src.jobs import send_weekly_update
+from src.broadcasts import resume_broadcasts
+from src.jobs import send_weekly_slot, prestage_weekly_update, weekly_slot_times, WEEKLY_SEND_JOB_DAY, WEEKLY_PROGRESS_KEY
+from src.utils.render_service import render_service
+from src.utils.image_generator import preload_fonts
+from src.utils.webapp import validate_init_data, life_table_payload
+from src.utils.run_metrics import to_prometheus
+from src.utils.outbound import outbound_scheduler
 
 # Load environment variables
 load_dotenv()
@@ -67,6 +75,46 @@ def home():
 init_database()
 user_repo = UserRepository()
 
+# Telegram Mini App: the page draws the table in the browser from the JSON below
+@app.route('/webapp')
+def webapp():
+    return render_template('webapp.html')
+
+@app.route('/webapp/api/table', methods=['POST'])
+def webapp_table():
+    """Returns the life table data of the Mini App user, identified by the signed initData."""
+    tg_user = validate_init_data(request.headers.get('X-Telegram-Init-Data', ''), TELEGRAM_TOKEN)
+    if not tg_user or 'id' not in tg_user:
+        return jsonify({"error": "Invalid init data"}), 403
+
+    user = user_repo.get_user(tg_user['id']) or {}
+    lang_code = user.get('language') or 'uz'
+    if not user.get('birthday'):
+        return jsonify({"error": localization.get_text("birthday_not_set_error", lang_code)}), 404
+
+    birthday = datetime.fromisoformat(str(user['birthday']).split(" ")[0])
+    return jsonify(life_table_payload(birthday, lang_code)), 200
+
+# Prometheus metrics of the weekly update runs, published to bot_data by every worker,
+# and of this process's outbound scheduler lanes. Only served when METRICS_TOKEN is set.
+@app.route('/metrics')
+def metrics():
+    if not METRICS_TOKEN:
+        return jsonify({"error": "Not found"}), 404
+    auth = request.headers.get('Authorization', '')
+    token = auth[len('Bearer '):] if auth.startswith('Bearer ') else request.args.get('token', '')
+    if not hmac.compare_digest(token, METRICS_TOKEN):
+        return jsonify({"error": "Unauthorized"}), 401
+    snapshots = [
+        snapshot for snapshot in StatsRepository.get_bot_data_by_prefix(WEEKLY_PROGRESS_KEY).values()
+        if isinstance(snapshot, dict)
+    ]
+    body = to_prometheus(snapshots) + outbound_scheduler.to_prometheus()
+    return Response(body, mimetype='text/plain; version=0.0.4')
+
+# Load the image fonts once, before the first render needs them
+preload_fonts()
+
 # Enable logging
 logging.basicConfig(
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO
@@ -74,7 +122,7 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 async def post_init(application: Application) -> None:
-    """Post-initialization function to set bot commands."""
+    """Post-initialization function to set bot commands and resume broadcasts."""
     bot_commands = {}
 
     # Get available languages, with a fallback
@@ -102,6 +150,13 @@ async def post_init(application: Application) -> None:
         
     logger.info("Bot commands set for all available languages.")
 
+    # Broadcasts that were running when the bot stopped continue where they left off
+    resume_broadcasts(application.bot)
+
+async def post_shutdown(application: Application) -> None:
+    """Stops the render worker pool."""
+    render_service.shutdown()
+
 persistence = SQLitePersistence("bot_database.db")
 
 application = (
@@ -109,17 +164,28 @@ application = (
     .token(TELEGRAM_TOKEN)
     .persistence(persistence)
     .post_init(post_init)
+    .post_shutdown(post_shutdown)
+    .rate_limiter(outbound_scheduler)
     .build()
 )
 
 # --- Add job to queue ---
 job_queue = application.job_queue
-# Run every Sunday at 15:27 Tashkent time (UTC+5)
-# 10:27 UTC
+# Every Sunday from 15:27 Tashkent time (UTC+5), 10:27 UTC by default, one job
+# per delivery slot, so the users are spread over the day instead of one spike
+for slot, slot_time in enumerate(weekly_slot_times()):
+    job_queue.run_daily(
+        send_weekly_slot,
+        time=slot_time.replace(tzinfo=pytz.utc),
+        days=(WEEKLY_SEND_JOB_DAY,),
+        data=slot,
+        name=f"weekly_update_slot_{slot}"
+    )
+# Pre-render (and optionally pre-upload) the images off-peak, at 01:00 UTC the same day
 job_queue.run_daily(
-    send_weekly_update, 
-    time=time(hour=10, minute=27, tzinfo=pytz.utc), 
-    days=(6,) # 0=Monday, 6=Sunday
+    prestage_weekly_update,
+    time=time(hour=1, minute=0, tzinfo=pytz.utc),
+    days=(WEEKLY_SEND_JOB_DAY,)
 )
 
 # Register handlers
@@ -1,21 +1,59 @@
+import argparse
 import asyncio
 import os
+import resource
 import sys
-from telegram.ext import Application
-from telegram import Bot
+import tempfile
+import time
+from telegram.ext import Application, ExtBot
 
 # Asosiy proyekt papkasini path'ga qo'shish
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__))))
 
-from src.config import TELEGRAM_TOKEN
-from src.jobs import send_weekly_update
+from src.config import TELEGRAM_TOKEN, WEEKLY_SEND_SLOTS
+from src.jobs import send_weekly_update, prestage_weekly_update, run_sharded_weekly_update
 from src.database.database import init_database
 from src.utils import localization
+from src.utils.render_cache import render_cache
+from src.utils.render_service import render_service
+from src.utils.render_spool import render_spool
+from src.utils.dry_run import FakeBot, use_temporary_database, seed_users
+from src.utils.outbound import outbound_scheduler
 
-async def main():
+def parse_shard(value: str) -> tuple:
+    """`--shard` qiymatini ("i/N") (i, N) ko'rinishiga o'tkazish."""
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError("shard i/N ko'rinishida bo'lishi kerak, masalan 0/4")
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"noto'g'ri shard: {value}")
+    return index, count
+
+def max_rss_mb(who: int = resource.RUSAGE_SELF) -> float:
+    # ru_maxrss Linux'da kilobaytda, macOS'da baytda
+    return resource.getrusage(who).ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+def print_dry_run_report(bot: FakeBot, users: int, elapsed: float):
+    """Sinov (dry run) natijalarini chiqarish: tezlik, render va yuborish vaqti, xotira."""
+    print("\n--- Sinov (dry run) natijalari ---")
+    print(f"Ishlangan foydalanuvchilar: {users}, vaqt: {elapsed:.1f} s, tezlik: {users / elapsed:.1f} foydalanuvchi/s")
+    print(f"Render: {render_service.rendered} ta rasm, {render_service.render_seconds:.1f} s (ishchilar bo'yicha jami)")
+    print(f"Yuborish: {bot.calls} ta so'rov ({bot.uploads} ta yuklash), {bot.send_seconds:.1f} s (so'rovlar bo'yicha jami)")
+    print(f"Kiritilgan xatolar: {dict(bot.errors) or 'yo`q'}")
+    print(f"Eng yuqori RSS: {max_rss_mb():.0f} MB, render ishchilari: {max_rss_mb(resource.RUSAGE_CHILDREN):.0f} MB")
+
+async def main(prestage: bool = False, shard: tuple = None, shards: int = None, slot: int = None,
+               dry_run: argparse.Namespace = None):
     """Haftalik xabarlarni yuborish uchun asosiy funksiya."""
     print("Haftalik xabar yuborish vazifasi ishga tushdi...")
     
+    if dry_run:
+        # Telegram'ga va asosiy bazaga tegmasdan: vaqtinchalik baza, spool va soxta bot
+        print(f"Sinov rejimi: vaqtinchalik baza {use_temporary_database()}")
+        render_spool.root = tempfile.mkdtemp(prefix="life-table-dry-run-spool-")
+        render_cache.disk_dir = None
+
     # Kerakli qismlarni initsializatsiya qilish
     init_database()
     try:
@@ -26,9 +64,23 @@ async def main():
         # Agar lokalizatsiya yuklanmasa, ishni to'xtatish
         return
 
+    if dry_run:
+        seed_users(dry_run.users, dry_run.seed)
+        print(f"{dry_run.users} ta sinov foydalanuvchisi yaratildi.")
+        bot = FakeBot(dry_run.latency / 1000, dry_run.upload_latency / 1000, dry_run.error_rate, dry_run.seed)
+        started = time.perf_counter()
+        try:
+            users = await run_job(bot, prestage, shard, shards, slot)
+        finally:
+            # Ishchilar tugashini kutish, aks holda ularning RSS'i hisoblanmaydi
+            render_service.shutdown(wait=True)
+        print_dry_run_report(bot, users, time.perf_counter() - started)
+        return
+
     # Bot obyektini yaratish
     # Bu yerda to'liq Application qurish shart emas, faqat Bot o'zi kerak
-    bot = Bot(token=TELEGRAM_TOKEN)
+    # Yuborishlar bot.py dagi kabi umumiy navbat (outbound scheduler) orqali o'tadi
+    bot = ExtBot(token=TELEGRAM_TOKEN, rate_limiter=outbound_scheduler)
     
     # `send_weekly_update` funksiyasi `ContextTypes.DEFAULT_TYPE` ga bog'liq
     # bo'lmasligi kerak yoki biz dummy context yaratishimiz kerak.
@@ -64,11 +116,54 @@ async def main():
 
         # Eng to'g'ri yo'l: `jobs.py` ni tahrirlash.
         # Men hozir buni qilaman.
-        await send_weekly_update(bot) # `context` o'rniga `bot` obyektini yuboramiz
-        print("✅ Haftalik xabarlar muvaffaqiyatli yuborildi (yoki yuboriladigan foydalanuvchilar topilmadi).")
+        await run_job(bot, prestage, shard, shards, slot)
 
     except Exception as e:
         print(f"❌ Haftalik xabarlarni yuborishda xatolik: {e}")
 
+async def run_job(bot, prestage: bool, shard: tuple, shards: int, slot: int) -> int:
+    """Tanlangan vazifani bajarish: oldindan tayyorlash, shard'lar yoki oddiy yuborish. Ishlangan foydalanuvchilar sonini qaytaradi."""
+    if prestage:
+        # Faqat rasmlarni oldindan tayyorlab qo'yish (yuborish keyinroq)
+        staged = await prestage_weekly_update(bot)
+        print(f"✅ {staged} ta foydalanuvchi uchun rasmlar tayyorlandi.")
+        return staged
+    if shards:
+        # Shard'larni jadval orqali band qilib, qolmaguncha yuborish
+        successful_sends, total_users = await run_sharded_weekly_update(bot, shards)
+        print(f"✅ Shard'lar bo'yicha {successful_sends}/{total_users} ta foydalanuvchiga yuborildi.")
+        return total_users
+    # `slot` berilsa, faqat shu vaqt oralig'idagi foydalanuvchilarga yuboriladi
+    slot = (slot, WEEKLY_SEND_SLOTS) if slot is not None else None
+    successful_sends, total_users = await send_weekly_update(bot, shard, slot) # `context` o'rniga `bot` obyektini yuboramiz
+    print("✅ Haftalik xabarlar muvaffaqiyatli yuborildi (yoki yuboriladigan foydalanuvchilar topilmadi).")
+    return total_users
+
 if __name__ == "__main__":
-    asyncio.run(main()) 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Haftalik xabarlarni yuborish")
+    parser.add_argument("--prestage", action="store_true", help="Rasmlarni yuborishdan oldin spool'ga tayyorlash")
+    # Bir nechta jarayon yoki server foydalanuvchilarni telegram_id bo'yicha bo'lib oladi.
+    # SEND_RATE har bir jarayonga alohida, shuning uchun uni jarayonlar soniga bo'lib qo'ying.
+    shard_group = parser.add_mutually_exclusive_group()
+    shard_group.add_argument("--shard", type=parse_shard, metavar="i/N",
+                             help="Faqat telegram_id %% N == i bo'lgan foydalanuvchilarga yuborish")
+    shard_group.add_argument("--shards", type=int, metavar="N",
+                             help="N ta shard'dan bo'shini bazadagi lease orqali band qilib yuborish")
+    parser.add_argument("--slot", type=int, metavar="i",
+                        help=f"Faqat i-vaqt oralig'idagi foydalanuvchilarga yuborish (0..{WEEKLY_SEND_SLOTS - 1})")
+    # Telegram'ga tegmasdan ishchilar sonini o'lchash uchun sinov rejimi
+    dry_run_group = parser.add_argument_group("sinov rejimi (--dry-run)")
+    dry_run_group.add_argument("--dry-run", action="store_true",
+                               help="Soxta bot va N ta sinov foydalanuvchili vaqtinchalik baza bilan ishlash")
+    dry_run_group.add_argument("--users", type=int, default=1000, help="Sinov foydalanuvchilari soni")
+    dry_run_group.add_argument("--latency", type=float, default=50, help="Bitta so'rov kechikishi, ms")
+    dry_run_group.add_argument("--upload-latency", type=float, default=300, help="Rasm yuklashning qo'shimcha kechikishi, ms")
+    dry_run_group.add_argument("--error-rate", type=float, default=0.01, help="Xato bilan tugaydigan so'rovlar ulushi")
+    dry_run_group.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    if args.prestage and (args.shard or args.shards or args.slot is not None):
+        parser.error("--prestage bilan --shard/--shards/--slot birga ishlatilmaydi")
+    if args.slot is not None and (args.shards or not 0 <= args.slot < WEEKLY_SEND_SLOTS):
+        parser.error(f"--slot 0..{WEEKLY_SEND_SLOTS - 1} oralig'ida bo'lishi va --shards bilan ishlatilmasligi kerak")
+    asyncio.run(main(prestage=args.prestage, shard=args.shard, shards=args.shards, slot=args.slot,
+                     dry_run=args if args.dry_run else None)) 
\ No newline at end of file
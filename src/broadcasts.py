@@ -0,0 +1,263 @@
+import asyncio
+import logging
+import time
+from itertools import islice
+from typing import Dict, Optional
+
+from telegram import Bot, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest
+
+from .config import SEND_CONCURRENCY, SEND_RATE, SEND_CHAT_INTERVAL
+from .database.broadcast_repository import (
+    BroadcastRepository, RUNNING, PAUSED, CANCELLED, FINISHED, SENT, RETRY, UNREACHABLE
+)
+from .database.delivery_repository import DeliveryRepository
+from .database.user_repository import UserRepository
+from .utils.outbound import BROADCAST_LANE, lane_args
+from .utils.rate_limit import SendLimiter, is_permanent_send_error
+
+logger = logging.getLogger(__name__)
+broadcast_repo = BroadcastRepository()
+delivery_repo = DeliveryRepository()
+user_repo = UserRepository()
+
+# Users read per batch; the cursor moves once every recipient of a batch is done
+BROADCAST_BATCH_SIZE = 500
+# Recipient results are written (and the status re-read) after this many sends
+RECIPIENT_FLUSH_SIZE = 50
+# Seconds between two edits of the admin's progress message
+PROGRESS_INTERVAL = 5.0
+# Seconds before a batch with transient send failures is read again
+RETRY_DELAY = 5.0
+
+# Broadcasts running in this process, by id
+_runs: Dict[int, "_BroadcastRun"] = {}
+
+
+def broadcast_status_text(broadcast: dict) -> str:
+    """The admin's progress message of a broadcast."""
+    title = {
+        RUNNING: "📢 *Broadcasting...*",
+        PAUSED: "⏸ *Broadcast Paused*",
+        CANCELLED: "✖️ *Broadcast Cancelled*",
+        FINISHED: "📢 *Broadcast Finished*",
+    }.get(broadcast["status"], "📢 *Broadcast*")
+    return (
+        f"{title} (#{broadcast['id']})\n\n"
+        f"✅ Sent: {broadcast['sent']}\n"
+        f"❌ Failed: {broadcast['failed']}\n"
+        f"📊 Total Users: {broadcast['total']}"
+    )
+
+
+def broadcast_keyboard(broadcast: dict) -> Optional[InlineKeyboardMarkup]:
+    """Pause/resume and cancel buttons of a broadcast that has not ended."""
+    broadcast_id = broadcast["id"]
+    if broadcast["status"] == RUNNING:
+        toggle = InlineKeyboardButton("⏸ Pause", callback_data=f"broadcast_pause:{broadcast_id}")
+    elif broadcast["status"] == PAUSED:
+        toggle = InlineKeyboardButton("▶️ Resume", callback_data=f"broadcast_resume:{broadcast_id}")
+    else:
+        return None
+    return InlineKeyboardMarkup([[toggle, InlineKeyboardButton("✖️ Cancel", callback_data=f"broadcast_cancel:{broadcast_id}")]])
+
+
+async def show_broadcast_status(bot: Bot, broadcast: dict) -> None:
+    """Edits the admin's progress message to the broadcast's current state."""
+    if not broadcast.get("status_message_id"):
+        return
+    try:
+        await bot.edit_message_text(
+            chat_id=broadcast["status_chat_id"],
+            message_id=broadcast["status_message_id"],
+            text=broadcast_status_text(broadcast),
+            parse_mode="Markdown",
+            reply_markup=broadcast_keyboard(broadcast)
+        )
+    except BadRequest as e:
+        if "message is not modified" not in str(e).lower():
+            logger.warning(f"Could not update the status message of broadcast {broadcast['id']}: {e}")
+    except Exception as e:
+        logger.warning(f"Could not update the status message of broadcast {broadcast['id']}: {e}")
+
+
+class _BroadcastRun:
+    """
+    Sends one broadcast with a bounded pool of workers. Users are read in batches
+    after the broadcast's cursor, recipients it already has a final status for are
+    skipped, and the cursor only moves once every user of a batch has one, so a
+    restart or a pause continues where it stopped without sending anything twice.
+    Users left by a pause and transient failures are sent to when the batch is read again.
+    """
+
+    def __init__(self, bot: Bot, broadcast: dict, concurrency: int = SEND_CONCURRENCY):
+        self.bot = bot
+        self.broadcast = broadcast
+        self.id = broadcast["id"]
+        self.status = broadcast["status"]
+        self.cursor = broadcast["after_user_id"]
+        self.interrupted = False
+        self.task: Optional[asyncio.Task] = None
+        self.concurrency = max(1, concurrency)
+        self.limiter = SendLimiter(SEND_RATE, SEND_CHAT_INTERVAL)
+        self.lane_args = lane_args(bot, BROADCAST_LANE)
+        self.queue = asyncio.Queue(maxsize=self.concurrency * 4)
+        self.unreachable = []
+        self._results = []
+        self._dead_letters = []
+        self._skipped = 0
+        self._retries = 0
+        self._reported = 0.0
+
+    def _refresh(self) -> None:
+        broadcast = broadcast_repo.get(self.id)
+        if broadcast:
+            self.broadcast = broadcast
+            self.status = broadcast["status"]
+
+    def _flush(self, after_user_id: Optional[int] = None) -> bool:
+        """
+        Writes the collected results (and cursor), then picks up status changes made
+        elsewhere. On failure the results are kept and the cursor stays, for the next flush.
+        """
+        results = self._results[:]
+        if not broadcast_repo.record_recipients(self.id, results, after_user_id):
+            return False
+        del self._results[:len(results)]
+        if after_user_id is not None:
+            self.cursor = after_user_id
+        self._refresh()
+        return True
+
+    async def _report(self, force: bool = False) -> None:
+        now = time.monotonic()
+        if force or now - self._reported >= PROGRESS_INTERVAL:
+            self._reported = now
+            await show_broadcast_status(self.bot, self.broadcast)
+
+    async def run(self) -> str:
+        """Sends until the broadcast is finished, paused or cancelled and returns that status."""
+        workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+        try:
+            while self.status == RUNNING:
+                users = list(islice(user_repo.iter_active_users(BROADCAST_BATCH_SIZE, self.cursor), BROADCAST_BATCH_SIZE))
+                if not users:
+                    broadcast_repo.set_status(self.id, FINISHED)
+                    self._refresh()
+                    break
+                # Final results not written yet count as done too, they are retried by the next flush
+                done = broadcast_repo.get_done(self.id, (telegram_id for _, telegram_id in users))
+                done.update(telegram_id for telegram_id, status, _ in self._results if status != RETRY)
+                self._skipped = self._retries = 0
+                for _, telegram_id in users:
+                    if telegram_id not in done:
+                        await self.queue.put(telegram_id)
+                await self.queue.join()
+                # Users skipped by a pause (even one resumed since) or left to retry keep
+                # the cursor where it is, the same batch is read again for them
+                complete = self.status == RUNNING and not self._skipped and not self._retries
+                if not self._flush(users[-1][0] if complete else None):
+                    await asyncio.sleep(1)
+                elif self._retries and self.status == RUNNING:
+                    await asyncio.sleep(RETRY_DELAY)
+                await self._report()
+            else:
+                # Paused or cancelled, not finished
+                self.interrupted = True
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            self._flush()
+            # Users who blocked the bot or deleted their account are not sent to again
+            delivery_repo.record_dead_letters(f"broadcast:{self.id}", self._dead_letters)
+            user_repo.deactivate_users(self.unreachable)
+        await self._report(force=True)
+        return self.status
+
+    async def _worker(self) -> None:
+        while True:
+            telegram_id = await self.queue.get()
+            try:
+                if self.status != RUNNING:
+                    # Left for a resume, the recipient has no status yet
+                    self._skipped += 1
+                    continue
+                await self._send(telegram_id)
+                if len(self._results) >= RECIPIENT_FLUSH_SIZE:
+                    self._flush()
+            finally:
+                self.queue.task_done()
+
+    async def _send(self, telegram_id: int) -> None:
+        try:
+            await self.limiter.call(
+                telegram_id, self.bot.copy_message,
+                chat_id=telegram_id,
+                from_chat_id=self.broadcast["from_chat_id"],
+                message_id=self.broadcast["message_id"],
+                **self.lane_args
+            )
+        except Exception as e:
+            if is_permanent_send_error(e):
+                logger.warning(f"User {telegram_id} cannot receive broadcast {self.id}: {e}")
+                self._results.append((telegram_id, UNREACHABLE, str(e)))
+                self._dead_letters.append((telegram_id, str(e)))
+                self.unreachable.append(telegram_id)
+            else:
+                logger.error(f"Failed to send broadcast {self.id} to {telegram_id}: {e}")
+                self._results.append((telegram_id, RETRY, str(e)))
+                self._retries += 1
+        else:
+            self._results.append((telegram_id, SENT, None))
+
+
+def start_broadcast(bot: Bot, broadcast_id: int) -> bool:
+    """Starts sending a running broadcast in the background. False if it is already being sent here."""
+    if broadcast_id in _runs:
+        return False
+    broadcast = broadcast_repo.get(broadcast_id)
+    if not broadcast or broadcast["status"] != RUNNING:
+        return False
+    run = _runs[broadcast_id] = _BroadcastRun(bot, broadcast)
+
+    async def send() -> None:
+        try:
+            status = await run.run()
+            logger.info(f"Broadcast {broadcast_id} stopped: {status}")
+        except Exception as e:
+            logger.error(f"Broadcast {broadcast_id} failed: {e}")
+            return
+        finally:
+            _runs.pop(broadcast_id, None)
+        # Resumed while this paused run was winding down: the run may already have
+        # read the new status back, so only the stored one is trusted here
+        if run.interrupted and (broadcast_repo.get(broadcast_id) or {}).get("status") == RUNNING:
+            start_broadcast(bot, broadcast_id)
+
+    # The run keeps a reference to its task, so it is not garbage-collected while sending
+    run.task = asyncio.create_task(send())
+    return True
+
+
+def set_broadcast_status(bot: Bot, broadcast_id: int, status: str) -> bool:
+    """
+    Pauses, resumes or cancels a broadcast. A run in this process sees the change
+    at once, one in another process at its next flush. Resuming starts sending here.
+    """
+    if not broadcast_repo.set_status(broadcast_id, status):
+        return False
+    run = _runs.get(broadcast_id)
+    if run:
+        run.status = status
+    elif status == RUNNING:
+        start_broadcast(bot, broadcast_id)
+    return True
+
+
+def resume_broadcasts(bot: Bot) -> int:
+    """Starts every broadcast left running by a previous process. Returns how many were started."""
+    started = sum(start_broadcast(bot, broadcast["id"]) for broadcast in broadcast_repo.get_by_status(RUNNING))
+    if started:
+        logger.info(f"Resumed {started} broadcast(s)")
+    return started
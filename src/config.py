@@ -8,4 +8,70 @@ load_dotenv()
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
 
 # Admin User ID
-ADMIN_ID = int(os.getenv("ADMIN_ID", 0)) 
\ No newline at end of file
+ADMIN_ID = int(os.getenv("ADMIN_ID", 0)) 
+
+# Public HTTPS URL of the Mini App page served by bot.py (e.g. https://example.com/webapp).
+# When set, "Get table" opens the table drawn in the browser instead of rendering a PNG.
+WEBAPP_URL = os.getenv("WEBAPP_URL") or None
+
+# Bearer token required by the /metrics endpoint (header or ?token=); unset disables the endpoint.
+METRICS_TOKEN = os.getenv("METRICS_TOKEN") or None
+
+# --- Life-table rendering ---
+# "weekly" shows the same quote of the week to every user of a language, which keeps
+# identical renders shareable through the render cache. "random" picks one per image.
+QUOTE_MODE = os.getenv("QUOTE_MODE", "weekly")
+
+# Memory budget of the in-process render cache, in bytes.
+RENDER_CACHE_MAX_BYTES = int(os.getenv("RENDER_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+
+# Optional directory for the on-disk render cache tier and its size budget (0 = unbounded).
+RENDER_CACHE_DIR = os.getenv("RENDER_CACHE_DIR") or None
+RENDER_CACHE_DISK_MAX_BYTES = int(os.getenv("RENDER_CACHE_DISK_MAX_BYTES", 0))
+
+# Worker processes used for rendering (0 renders in a background thread instead)
+# and how many renders may be queued before callers have to wait. Every worker is
+# a Python + Pillow process of roughly 50-150 MB, and in a container cpu_count()
+# reports the host's CPUs, so the default stays small.
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", min(2, os.cpu_count() or 1)))
+RENDER_QUEUE_SIZE = int(os.getenv("RENDER_QUEUE_SIZE", RENDER_WORKERS * 4 or 4))
+
+# Number of neighbouring images a worker renders in one go during batch renders.
+RENDER_BATCH_SIZE = int(os.getenv("RENDER_BATCH_SIZE", 16))
+
+# Output encoding of rendered images: "png", "webp" or "jpeg". PNGs use a fixed
+# colour palette unless IMAGE_PALETTE=0, IMAGE_COMPRESS_LEVEL is the PNG zlib level
+# and IMAGE_QUALITY applies to WebP/JPEG (WebP at 100 is lossless).
+IMAGE_FORMAT = os.getenv("IMAGE_FORMAT", "png").lower()
+IMAGE_PALETTE = os.getenv("IMAGE_PALETTE", "1").lower() in ("1", "true", "yes")
+IMAGE_COMPRESS_LEVEL = int(os.getenv("IMAGE_COMPRESS_LEVEL", 6))
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", 90))
+
+# Directory of the pre-rendered weekly spool, and an optional chat (e.g. a private
+# channel) the pre-staging job uploads each distinct image to, so that the Sunday
+# sends only reuse file_ids.
+SPOOL_DIR = os.getenv("SPOOL_DIR", "cache/spool")
+SPOOL_UPLOAD_CHAT_ID = os.getenv("SPOOL_UPLOAD_CHAT_ID") or None
+
+# --- Weekly sends ---
+# Concurrent senders, messages per second across all chats (Telegram allows about
+# 30 for bulk sends) and minimum seconds between two messages to the same chat.
+# The rate is per process: sharded workers (run_weekly_job.py --shards) should split it.
+SEND_CONCURRENCY = int(os.getenv("SEND_CONCURRENCY", 8))
+SEND_RATE = float(os.getenv("SEND_RATE", 25))
+SEND_CHAT_INTERVAL = float(os.getenv("SEND_CHAT_INTERVAL", 1.0))
+# The weekly update is spread over WEEKLY_SEND_SLOTS slots, WEEKLY_SLOT_MINUTES apart,
+# starting at WEEKLY_SEND_TIME (UTC, "HH:MM"); every user has a stable slot. The last
+# slot must start before midnight. WEEKLY_SEND_SLOTS=1 sends everyone at once.
+WEEKLY_SEND_TIME = os.getenv("WEEKLY_SEND_TIME", "10:27")
+WEEKLY_SEND_SLOTS = int(os.getenv("WEEKLY_SEND_SLOTS", 12))
+WEEKLY_SLOT_MINUTES = int(os.getenv("WEEKLY_SLOT_MINUTES", 30))
+
+# --- Outbound scheduler ---
+# Messages per second the bot process sends in total, shared by the interactive,
+# weekly and broadcast lanes. Interactive replies go first; while the weekly and
+# broadcast lanes have messages waiting they still get at least these fractions
+# of the recent sends.
+OUTBOUND_RATE = float(os.getenv("OUTBOUND_RATE", 30))
+OUTBOUND_WEEKLY_SHARE = float(os.getenv("OUTBOUND_WEEKLY_SHARE", 0.25))
+OUTBOUND_BROADCAST_SHARE = float(os.getenv("OUTBOUND_BROADCAST_SHARE", 0.1))
@@ -0,0 +1,173 @@
+from sqlalchemy.exc import SQLAlchemyError
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from .models import Broadcast, BroadcastRecipient
+from .database import DatabaseSession
+
+logger = logging.getLogger(__name__)
+
+# Broadcast statuses; cancelled and finished broadcasts never run again
+RUNNING = "running"
+PAUSED = "paused"
+CANCELLED = "cancelled"
+FINISHED = "finished"
+
+# Recipient statuses; only a retry is sent to again, the others are final
+SENT = "sent"
+RETRY = "retry"
+FAILED = "failed"
+UNREACHABLE = "unreachable"
+# Sends tried before a transient failure (network error, flood control) becomes final
+SEND_ATTEMPTS = 3
+
+class BroadcastRepository:
+    """Broadcast jobs, their recipient cursor and the status of every recipient."""
+
+    @staticmethod
+    def _to_dict(broadcast: Broadcast) -> Dict[str, Any]:
+        return {
+            'id': broadcast.id,
+            'from_chat_id': broadcast.from_chat_id,
+            'message_id': broadcast.message_id,
+            'status': broadcast.status,
+            'after_user_id': broadcast.after_user_id or 0,
+            'total': broadcast.total or 0,
+            'sent': broadcast.sent or 0,
+            'failed': broadcast.failed or 0,
+            'status_chat_id': broadcast.status_chat_id,
+            'status_message_id': broadcast.status_message_id,
+            'created_at': broadcast.created_at
+        }
+
+    @staticmethod
+    def create(from_chat_id: int, message_id: int, total: int) -> Optional[int]:
+        """Stores a new running broadcast of the message `message_id` in `from_chat_id`. Returns its id."""
+        try:
+            with DatabaseSession() as session:
+                broadcast = Broadcast(
+                    from_chat_id=from_chat_id, message_id=message_id, status=RUNNING, total=total
+                )
+                session.add(broadcast)
+                session.commit()
+                return broadcast.id
+        except SQLAlchemyError as e:
+            logger.error(f"Error creating broadcast of message {message_id}: {e}")
+            return None
+
+    @staticmethod
+    def get(broadcast_id: int) -> Optional[Dict[str, Any]]:
+        """Get a broadcast as a dictionary."""
+        try:
+            with DatabaseSession() as session:
+                broadcast = session.query(Broadcast).filter(Broadcast.id == broadcast_id).first()
+                return BroadcastRepository._to_dict(broadcast) if broadcast else None
+        except SQLAlchemyError as e:
+            logger.error(f"Error getting broadcast {broadcast_id}: {e}")
+            return None
+
+    @staticmethod
+    def get_by_status(status: str) -> List[Dict[str, Any]]:
+        """Get all broadcasts with `status`, oldest first."""
+        try:
+            with DatabaseSession() as session:
+                broadcasts = session.query(Broadcast).filter(Broadcast.status == status).order_by(Broadcast.id).all()
+                return [BroadcastRepository._to_dict(broadcast) for broadcast in broadcasts]
+        except SQLAlchemyError as e:
+            logger.error(f"Error getting {status} broadcasts: {e}")
+            return []
+
+    @staticmethod
+    def set_status(broadcast_id: int, status: str) -> bool:
+        """Changes the status of a broadcast unless it is already cancelled or finished."""
+        try:
+            with DatabaseSession() as session:
+                updated = session.query(Broadcast).filter(
+                    Broadcast.id == broadcast_id,
+                    Broadcast.status.notin_((CANCELLED, FINISHED))
+                ).update({'status': status}, synchronize_session=False)
+                session.commit()
+                return bool(updated)
+        except SQLAlchemyError as e:
+            logger.error(f"Error setting status of broadcast {broadcast_id} to {status}: {e}")
+            return False
+
+    @staticmethod
+    def set_status_message(broadcast_id: int, chat_id: int, message_id: int) -> bool:
+        """Remembers the admin's progress message of a broadcast."""
+        try:
+            with DatabaseSession() as session:
+                session.query(Broadcast).filter(Broadcast.id == broadcast_id).update(
+                    {'status_chat_id': chat_id, 'status_message_id': message_id}, synchronize_session=False
+                )
+                session.commit()
+                return True
+        except SQLAlchemyError as e:
+            logger.error(f"Error setting status message of broadcast {broadcast_id}: {e}")
+            return False
+
+    @staticmethod
+    def get_done(broadcast_id: int, telegram_ids: Iterable[int]) -> Set[int]:
+        """Returns the ids among `telegram_ids` with a final status: sent, failed or unreachable."""
+        telegram_ids = list(telegram_ids)
+        if not telegram_ids:
+            return set()
+        try:
+            with DatabaseSession() as session:
+                rows = session.query(BroadcastRecipient.telegram_id).filter(
+                    BroadcastRecipient.broadcast_id == broadcast_id,
+                    BroadcastRecipient.telegram_id.in_(telegram_ids),
+                    BroadcastRecipient.status != RETRY
+                ).all()
+                return {telegram_id for telegram_id, in rows}
+        except SQLAlchemyError as e:
+            logger.error(f"Error reading recipients of broadcast {broadcast_id}: {e}")
+            return set()
+
+    @staticmethod
+    def record_recipients(
+        broadcast_id: int, results: Iterable[Tuple[int, str, Optional[str]]], after_user_id: Optional[int] = None
+    ) -> bool:
+        """
+        Records (telegram_id, status, error) results of a broadcast and adds the final
+        ones to its counters, and with `after_user_id` moves its cursor, in one transaction.
+        A RETRY result counts an attempt and becomes FAILED after SEND_ATTEMPTS of them.
+        Recipients that already have a final status are skipped.
+        """
+        results = {telegram_id: (status, error) for telegram_id, status, error in results}
+        if not results and after_user_id is None:
+            return True
+        try:
+            with DatabaseSession() as session:
+                recorded = {
+                    recipient.telegram_id: recipient for recipient in session.query(BroadcastRecipient).filter(
+                        BroadcastRecipient.broadcast_id == broadcast_id,
+                        BroadcastRecipient.telegram_id.in_(list(results))
+                    ).all()
+                } if results else {}
+                sent = failed = 0
+                for telegram_id, (status, error) in results.items():
+                    recipient = recorded.get(telegram_id)
+                    if recipient is None:
+                        recipient = BroadcastRecipient(broadcast_id=broadcast_id, telegram_id=telegram_id, attempts=0)
+                        session.add(recipient)
+                    elif recipient.status != RETRY:
+                        continue
+                    recipient.attempts = (recipient.attempts or 0) + 1
+                    if status == RETRY and recipient.attempts >= SEND_ATTEMPTS:
+                        status = FAILED
+                    recipient.status = status
+                    recipient.error = error
+                    if status == SENT:
+                        sent += 1
+                    elif status != RETRY:
+                        failed += 1
+                values = {'sent': Broadcast.sent + sent, 'failed': Broadcast.failed + failed}
+                if after_user_id is not None:
+                    values['after_user_id'] = after_user_id
+                session.query(Broadcast).filter(Broadcast.id == broadcast_id).update(values, synchronize_session=False)
+                session.commit()
+                return True
+        except SQLAlchemyError as e:
+            logger.error(f"Error recording recipients of broadcast {broadcast_id}: {e}")
+            return False
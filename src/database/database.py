@@ -23,6 +23,12 @@ engine = create_engine(
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+def configure_database(url: str):
+    """Points the engine and every new session at another database, e.g. a throwaway one for a dry run."""
+    global engine
+    engine = create_engine(url, echo=False, pool_pre_ping=True)
+    SessionLocal.configure(bind=engine)
+
 def init_database():
     """Initialize the database by creating all tables."""
     try:
@@ -0,0 +1,101 @@
+from sqlalchemy.exc import SQLAlchemyError
+import logging
+from typing import Iterable, Optional, Set, Tuple
+
+from .models import WeeklyDelivery, DeadLetter
+from .database import DatabaseSession
+from .user_repository import in_shard, in_slot
+
+logger = logging.getLogger(__name__)
+
+class DeliveryRepository:
+    """Ledger of which user got the weekly update of which ISO week."""
+    
+    @staticmethod
+    def get_delivered(week: str, telegram_ids: Iterable[int]) -> Set[int]:
+        """Returns the ids among `telegram_ids` that already got the update of `week`."""
+        telegram_ids = list(telegram_ids)
+        if not telegram_ids:
+            return set()
+        try:
+            with DatabaseSession() as session:
+                rows = session.query(WeeklyDelivery.telegram_id).filter(
+                    WeeklyDelivery.week == week,
+                    WeeklyDelivery.telegram_id.in_(telegram_ids)
+                ).all()
+                return {telegram_id for telegram_id, in rows}
+        except SQLAlchemyError as e:
+            logger.error(f"Error reading weekly deliveries of {week}: {e}")
+            return set()
+    
+    @staticmethod
+    def record_deliveries(week: str, telegram_ids: Iterable[int]) -> bool:
+        """Records that `telegram_ids` got the update of `week`; ids already recorded are skipped."""
+        telegram_ids = set(telegram_ids)
+        if not telegram_ids:
+            return True
+        try:
+            with DatabaseSession() as session:
+                recorded = {
+                    telegram_id for telegram_id, in session.query(WeeklyDelivery.telegram_id).filter(
+                        WeeklyDelivery.week == week,
+                        WeeklyDelivery.telegram_id.in_(telegram_ids)
+                    ).all()
+                }
+                session.add_all(
+                    WeeklyDelivery(telegram_id=telegram_id, week=week)
+                    for telegram_id in telegram_ids - recorded
+                )
+                session.commit()
+                return True
+        except SQLAlchemyError as e:
+            logger.error(f"Error recording weekly deliveries of {week}: {e}")
+            return False
+    
+    @staticmethod
+    def count_delivered(
+        week: str, shard: Optional[Tuple[int, int]] = None, slot: Optional[Tuple[int, int]] = None
+    ) -> int:
+        """Counts the users who got the update of `week`, optionally only those of `shard` and `slot`."""
+        try:
+            with DatabaseSession() as session:
+                return session.query(WeeklyDelivery).filter(
+                    WeeklyDelivery.week == week,
+                    in_shard(WeeklyDelivery.telegram_id, shard),
+                    in_slot(WeeklyDelivery.telegram_id, slot)
+                ).count()
+        except SQLAlchemyError as e:
+            logger.error(f"Error counting weekly deliveries of {week}: {e}")
+            return 0
+    
+    @staticmethod
+    def record_dead_letters(job: str, failures: Iterable[Tuple[int, str]]) -> bool:
+        """Records sends that failed for good, as (telegram_id, error) pairs, under `job`."""
+        failures = list(failures)
+        if not failures:
+            return True
+        try:
+            with DatabaseSession() as session:
+                session.add_all(
+                    DeadLetter(telegram_id=telegram_id, job=job, error=error)
+                    for telegram_id, error in failures
+                )
+                session.commit()
+                return True
+        except SQLAlchemyError as e:
+            logger.error(f"Error recording dead letters of {job}: {e}")
+            return False
+    
+    @staticmethod
+    def prune(keep_week: str) -> int:
+        """Deletes the ledger entries of weeks before `keep_week`. Returns the number of deleted rows."""
+        try:
+            with DatabaseSession() as session:
+                deleted = session.query(WeeklyDelivery).filter(
+                    WeeklyDelivery.week < keep_week
+                ).delete(synchronize_session=False)
+                session.commit()
+                return deleted
+        except SQLAlchemyError as e:
+            logger.error(f"Error pruning weekly deliveries: {e}")
+            return 0
@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Boolean, Text
+from sqlalchemy import create_engine, Column, Integer, String, DateTime, Boolean, Text, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from datetime import datetime
@@ -38,4 +38,62 @@ class BotData(Base):
     key = Column(String(100), unique=True, nullable=False)
     value = Column(Text, nullable=True)  # JSON string for complex data
     created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow) 
\ No newline at end of file
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow) 
+
+class WeeklyDelivery(Base):
+    __tablename__ = 'weekly_deliveries'
+    __table_args__ = (UniqueConstraint('week', 'telegram_id', name='uq_weekly_delivery'),)
+    
+    id = Column(Integer, primary_key=True)
+    telegram_id = Column(Integer, nullable=False)
+    week = Column(String(8), nullable=False)  # ISO week of the update, e.g. "2026-W42"
+    delivered_at = Column(DateTime, default=datetime.utcnow)
+
+class WeeklyShardLease(Base):
+    __tablename__ = 'weekly_shard_leases'
+    __table_args__ = (UniqueConstraint('week', 'shard_count', 'shard', name='uq_weekly_shard_lease'),)
+    
+    id = Column(Integer, primary_key=True)
+    week = Column(String(8), nullable=False)  # ISO week of the update, e.g. "2026-W42"
+    shard_count = Column(Integer, nullable=False)
+    shard = Column(Integer, nullable=False)
+    owner = Column(String(100), nullable=False)  # worker holding the lease, e.g. "host:pid"
+    expires_at = Column(DateTime, nullable=False)
+    done = Column(Boolean, default=False)
+
+class DeadLetter(Base):
+    __tablename__ = 'dead_letters'
+    
+    id = Column(Integer, primary_key=True)
+    telegram_id = Column(Integer, nullable=False)
+    job = Column(String(50), nullable=False)  # what failed, e.g. "weekly_update:2026-W42"
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class Broadcast(Base):
+    __tablename__ = 'broadcasts'
+    
+    id = Column(Integer, primary_key=True)
+    from_chat_id = Column(Integer, nullable=False)  # the admin's message that is copied to every user
+    message_id = Column(Integer, nullable=False)
+    status = Column(String(16), default='running')  # running | paused | cancelled | finished
+    after_user_id = Column(Integer, default=0)  # users.id up to which every recipient is done
+    total = Column(Integer, default=0)
+    sent = Column(Integer, default=0)
+    failed = Column(Integer, default=0)
+    status_chat_id = Column(Integer, nullable=True)  # progress message with the control buttons
+    status_message_id = Column(Integer, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class BroadcastRecipient(Base):
+    __tablename__ = 'broadcast_recipients'
+    __table_args__ = (UniqueConstraint('broadcast_id', 'telegram_id', name='uq_broadcast_recipient'),)
+    
+    id = Column(Integer, primary_key=True)
+    broadcast_id = Column(Integer, nullable=False)
+    telegram_id = Column(Integer, nullable=False)
+    status = Column(String(16), nullable=False)  # sent | retry | failed | unreachable
+    attempts = Column(Integer, default=1)  # sends tried; a retry becomes failed after SEND_ATTEMPTS
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,78 @@
+from sqlalchemy.exc import SQLAlchemyError
+from datetime import datetime, timedelta
+import logging
+from typing import Optional
+
+from .models import WeeklyShardLease
+from .database import DatabaseSession
+
+logger = logging.getLogger(__name__)
+
+class ShardLeaseRepository:
+    """
+    Leases on the shards of a weekly update, so several workers can split the
+    users between them. A worker holds a shard until its lease expires; a shard
+    whose worker died is taken over once the lease has expired.
+    """
+    
+    @staticmethod
+    def claim(week: str, shard_count: int, owner: str, ttl: float) -> Optional[int]:
+        """Claims a shard of `week` that is neither done nor leased. Returns its index, or None if there is none left."""
+        now = datetime.utcnow()
+        expires_at = now + timedelta(seconds=ttl)
+        for shard in range(shard_count):
+            try:
+                with DatabaseSession() as session:
+                    lease = session.query(WeeklyShardLease).filter_by(
+                        week=week, shard_count=shard_count, shard=shard
+                    ).first()
+                    if lease is None:
+                        session.add(WeeklyShardLease(
+                            week=week, shard_count=shard_count, shard=shard, owner=owner, expires_at=expires_at
+                        ))
+                        session.commit()
+                        return shard
+                    if lease.done or lease.expires_at > now:
+                        continue
+                    # Take the expired lease over, unless another worker just did
+                    taken = session.query(WeeklyShardLease).filter(
+                        WeeklyShardLease.id == lease.id,
+                        WeeklyShardLease.owner == lease.owner,
+                        WeeklyShardLease.expires_at == lease.expires_at
+                    ).update({'owner': owner, 'expires_at': expires_at}, synchronize_session=False)
+                    session.commit()
+                    if taken:
+                        logger.info(f"Took over expired lease on shard {shard}/{shard_count} of {week} from {lease.owner}")
+                        return shard
+            except SQLAlchemyError as e:
+                # Most likely another worker inserted the same lease first
+                logger.debug(f"Could not claim shard {shard}/{shard_count} of {week}: {e}")
+        return None
+    
+    @staticmethod
+    def renew(week: str, shard_count: int, shard: int, owner: str, ttl: float) -> bool:
+        """Extends a lease `owner` holds. Returns False if the lease was lost."""
+        try:
+            with DatabaseSession() as session:
+                renewed = session.query(WeeklyShardLease).filter_by(
+                    week=week, shard_count=shard_count, shard=shard, owner=owner
+                ).update({'expires_at': datetime.utcnow() + timedelta(seconds=ttl)}, synchronize_session=False)
+                session.commit()
+                return bool(renewed)
+        except SQLAlchemyError as e:
+            logger.error(f"Error renewing lease on shard {shard}/{shard_count} of {week}: {e}")
+            return False
+    
+    @staticmethod
+    def finish(week: str, shard_count: int, shard: int, owner: str) -> bool:
+        """Marks a shard `owner` holds as done."""
+        try:
+            with DatabaseSession() as session:
+                finished = session.query(WeeklyShardLease).filter_by(
+                    week=week, shard_count=shard_count, shard=shard, owner=owner
+                ).update({'done': True}, synchronize_session=False)
+                session.commit()
+                return bool(finished)
+        except SQLAlchemyError as e:
+            logger.error(f"Error finishing shard {shard}/{shard_count} of {week}: {e}")
+            return False
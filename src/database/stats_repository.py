@@ -126,6 +126,38 @@ class StatsRepository:
             logger.error(f"Error getting bot data: {e}")
             return None
     
+    @staticmethod
+    def get_bot_data_by_prefix(prefix: str) -> Dict[str, Any]:
+        """Get all bot data whose key starts with `prefix`, keyed by the full key."""
+        try:
+            with DatabaseSession() as session:
+                rows = session.query(BotData.key, BotData.value).filter(BotData.key.startswith(prefix)).all()
+                result = {}
+                for key, value in rows:
+                    try:
+                        result[key] = json.loads(value) if value else None
+                    except json.JSONDecodeError:
+                        result[key] = value
+                return result
+        except SQLAlchemyError as e:
+            logger.error(f"Error getting bot data with prefix '{prefix}': {e}")
+            return {}
+    
+    @staticmethod
+    def delete_bot_data_by_prefix(prefix: str, updated_before: datetime) -> int:
+        """Deletes bot data whose key starts with `prefix` and that was last set before `updated_before`. Returns the number of deleted rows."""
+        try:
+            with DatabaseSession() as session:
+                deleted = session.query(BotData).filter(
+                    BotData.key.startswith(prefix),
+                    BotData.updated_at < updated_before
+                ).delete(synchronize_session=False)
+                session.commit()
+                return deleted
+        except SQLAlchemyError as e:
+            logger.error(f"Error deleting bot data with prefix '{prefix}': {e}")
+            return 0
+    
     @staticmethod
     def delete_bot_data(key: str) -> bool:
         """Delete bot data from the database."""
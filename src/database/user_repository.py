@@ -1,14 +1,45 @@
+from sqlalchemy import BigInteger, cast, true
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError
 from datetime import datetime
 import logging
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Iterator, NamedTuple, Tuple
 
 from .models import User, CommandUsage, BotData
 from .database import DatabaseSession
 
 logger = logging.getLogger(__name__)
 
+class UserBirthday(NamedTuple):
+    """Lightweight row streamed to the weekly job."""
+    id: int
+    telegram_id: int
+    language: Optional[str]
+    birthday: datetime
+
+# Weekly delivery slots come from a multiplicative hash of telegram_id that SQL can
+# evaluate and that does not line up with the telegram_id % N shards.
+_SLOT_HASH_MULTIPLIER = 7919
+_SLOT_HASH_MODULUS = 1000003
+
+def in_shard(telegram_id_column, shard: Optional[Tuple[int, int]]):
+    """SQL condition for users of shard (index, count): telegram_id % count == index."""
+    if shard is None:
+        return true()
+    index, count = shard
+    return telegram_id_column % count == index
+
+def in_slot(telegram_id_column, slot: Optional[Tuple[int, int]]):
+    """SQL condition for users whose delivery_slot() out of `count` slots is `index`, for slot (index, count)."""
+    if slot is None:
+        return true()
+    index, count = slot
+    return cast(telegram_id_column, BigInteger) * _SLOT_HASH_MULTIPLIER % _SLOT_HASH_MODULUS % count == index
+
+def delivery_slot(telegram_id: int, count: int) -> int:
+    """The stable weekly delivery slot of a user, out of `count` slots."""
+    return telegram_id * _SLOT_HASH_MULTIPLIER % _SLOT_HASH_MODULUS % count
+
 class UserRepository:
     """Repository for user-related database operations."""
     
@@ -155,6 +186,98 @@ class UserRepository:
             logger.error(f"Error getting users with birthday: {e}")
             return []
     
+    @staticmethod
+    def iter_users_with_birthday(
+        batch_size: int = 1000,
+        after_id: int = 0,
+        shard: Optional[Tuple[int, int]] = None,
+        slot: Optional[Tuple[int, int]] = None
+    ) -> Iterator[UserBirthday]:
+        """
+        Streams active users who have set their birthday, ordered by row id, as
+        UserBirthday tuples. Rows are fetched in keyset batches (id > last id), each
+        in its own short session, so memory stays flat and no transaction is held
+        open while the caller sends. `after_id` resumes after a given row id, and
+        `shard` and `slot` (index, count) only stream the users of that shard or delivery slot.
+        A failed batch raises SQLAlchemyError, so a weekly run stops short of finishing
+        and the next one resumes from its checkpoint.
+        """
+        while True:
+            try:
+                with DatabaseSession() as session:
+                    query = session.query(User.id, User.telegram_id, User.language, User.birthday).filter(
+                        User.is_active == True,
+                        User.birthday.isnot(None),
+                        User.id > after_id,
+                        in_shard(User.telegram_id, shard),
+                        in_slot(User.telegram_id, slot)
+                    )
+                    rows = query.order_by(User.id).limit(batch_size).all()
+            except SQLAlchemyError as e:
+                # Ending the stream here would look like the last user was reached
+                logger.error(f"Error streaming users with birthday after id {after_id}: {e}")
+                raise
+            for row in rows:
+                yield UserBirthday(*row)
+            if len(rows) < batch_size:
+                return
+            after_id = rows[-1].id
+
+    @staticmethod
+    def count_users_with_birthday(
+        shard: Optional[Tuple[int, int]] = None, slot: Optional[Tuple[int, int]] = None, after_id: int = 0
+    ) -> int:
+        """
+        Counts active users who have set their birthday, optionally only those of
+        `shard` and `slot`, and only those after row id `after_id`.
+        """
+        try:
+            with DatabaseSession() as session:
+                return session.query(User).filter(
+                    User.is_active == True,
+                    User.birthday.isnot(None),
+                    User.id > after_id,
+                    in_shard(User.telegram_id, shard),
+                    in_slot(User.telegram_id, slot)
+                ).count()
+        except SQLAlchemyError as e:
+            logger.error(f"Error counting users with birthday: {e}")
+            return 0
+
+    @staticmethod
+    def iter_active_users(batch_size: int = 1000, after_id: int = 0) -> Iterator[Tuple[int, int]]:
+        """
+        Streams (row id, telegram_id) of all active users ordered by row id, in keyset
+        batches like iter_users_with_birthday; `after_id` resumes after a given row id.
+        A failed batch raises SQLAlchemyError.
+        """
+        while True:
+            try:
+                with DatabaseSession() as session:
+                    rows = session.query(User.id, User.telegram_id).filter(
+                        User.is_active == True,
+                        User.id > after_id
+                    ).order_by(User.id).limit(batch_size).all()
+            except SQLAlchemyError as e:
+                # Ending the stream here would look like the last user was reached
+                logger.error(f"Error streaming active users after id {after_id}: {e}")
+                raise
+            for row in rows:
+                yield tuple(row)
+            if len(rows) < batch_size:
+                return
+            after_id = rows[-1].id
+
+    @staticmethod
+    def count_active_users() -> int:
+        """Counts active users."""
+        try:
+            with DatabaseSession() as session:
+                return session.query(User).filter(User.is_active == True).count()
+        except SQLAlchemyError as e:
+            logger.error(f"Error counting active users: {e}")
+            return 0
+
     @staticmethod
     def get_new_users_stats() -> Dict[str, int]:
         """Get statistics about new users in different time periods."""
@@ -185,6 +308,24 @@ class UserRepository:
             logger.error(f"Error getting new users stats: {e}")
             return {'24h': 0, '7d': 0, '30d': 0}
     
+    @staticmethod
+    def deactivate_users(telegram_ids: List[int]) -> int:
+        """Marks many users as inactive with one UPDATE. Returns the number of deactivated users."""
+        if not telegram_ids:
+            return 0
+        try:
+            with DatabaseSession() as session:
+                deactivated = session.query(User).filter(
+                    User.telegram_id.in_(telegram_ids),
+                    User.is_active == True
+                ).update({'is_active': False, 'updated_at': datetime.utcnow()}, synchronize_session=False)
+                session.commit()
+                logger.info(f"Deactivated {deactivated} users")
+                return deactivated
+        except SQLAlchemyError as e:
+            logger.error(f"Error deactivating {len(telegram_ids)} users: {e}")
+            return 0
+    
     @staticmethod
     def deactivate_user(telegram_id: int) -> bool:
         """Marks a user as inactive."""
@@ -1,9 +1,9 @@
 import os
-import asyncio
 from functools import wraps
 import logging
 
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest
 from telegram.ext import ContextTypes
 
 from src.config import ADMIN_ID
@@ -11,11 +11,17 @@ from src.database.user_repository import UserRepository
 from src.database.stats_repository import StatsRepository
 from src.utils import localization
 from src.utils.helpers import get_user_lang
-from src.jobs import send_weekly_update
+from src.jobs import send_weekly_update, WEEKLY_PROGRESS_KEY
+from src.utils.run_metrics import format_progress
+from src.database.broadcast_repository import BroadcastRepository, RUNNING, PAUSED, CANCELLED
+from src.broadcasts import (
+    broadcast_status_text, broadcast_keyboard, show_broadcast_status, start_broadcast, set_broadcast_status
+)
 
 # Initialize repositories and logger
 user_repo = UserRepository()
 stats_repo = StatsRepository()
+broadcast_repo = BroadcastRepository()
 logger = logging.getLogger(__name__)
 
 # Environment variables
@@ -48,7 +54,8 @@ async def admin_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
     keyboard = [
         [InlineKeyboardButton(localization.get_text("admin.broadcast_button", lang_code), callback_data="admin_broadcast")],
         [InlineKeyboardButton(localization.get_text("admin.analytics_button", lang_code), callback_data="admin_analytics")],
-        [InlineKeyboardButton(localization.get_text("admin.manual_weekly_update_button", lang_code), callback_data="admin_manual_weekly_update")]
+        [InlineKeyboardButton(localization.get_text("admin.manual_weekly_update_button", lang_code), callback_data="admin_manual_weekly_update")],
+        [InlineKeyboardButton(localization.get_text("admin.weekly_progress_button", lang_code), callback_data="admin_weekly_progress")]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
     await update.message.reply_text(text=localization.get_text("admin.admin_menu_title", lang_code), reply_markup=reply_markup)
@@ -67,50 +74,52 @@ async def manual_weekly_update_callback(update: Update, context: ContextTypes.DE
     )
     await update.callback_query.message.reply_text(text=response_text)
 
+@admin_only
+async def weekly_progress_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Shows the progress and stage timings of the latest weekly update runs (one per shard/slot)."""
+    snapshots = sorted(
+        (snapshot for snapshot in stats_repo.get_bot_data_by_prefix(WEEKLY_PROGRESS_KEY).values() if isinstance(snapshot, dict)),
+        key=lambda snapshot: snapshot.get("updated", ""), reverse=True
+    )[:5]
+    progress_text = "\n\n".join(format_progress(snapshot) for snapshot in snapshots) or "No weekly update has run yet."
+    reply_markup = InlineKeyboardMarkup([[InlineKeyboardButton("🔄 Refresh", callback_data="admin_weekly_progress")]])
+    try:
+        await update.callback_query.edit_message_text(
+            text=f"📈 *Weekly Update Progress*\n\n{progress_text}", parse_mode="Markdown", reply_markup=reply_markup
+        )
+    except BadRequest as e:
+        # Refreshing a finished run gives the same text again
+        if "message is not modified" not in str(e).lower():
+            raise
+
 async def handle_broadcast_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle broadcast messages from admin."""
     if not context.user_data.get('awaiting_broadcast'):
         return
 
     context.user_data.pop('awaiting_broadcast')
-    
-    all_users = user_repo.get_all_users()
-    all_user_ids = [user['telegram_id'] for user in all_users]
-    
-    successful_sends = 0
-    failed_sends = 0
-    
     message = update.message
-    
-    # Show initial status to admin
-    await message.reply_text(f"📢 Broadcasting to {len(all_user_ids)} users. Please wait...")
-    
-    async def send_message_to_user(user_id):
-        nonlocal successful_sends, failed_sends
-        try:
-            # copy_message handles all message types including text, photo, video etc.
-            await context.bot.copy_message(
-                chat_id=user_id, 
-                from_chat_id=message.chat_id, 
-                message_id=message.message_id
-            )
-            successful_sends += 1
-        except Exception as e:
-            error_message = str(e).lower()
-            logger.error(f"Failed to send broadcast to {user_id}: {error_message}")
-            failed_sends += 1
-            if "user is deactivated" in error_message or "bot was blocked by the user" in error_message:
-                user_repo.deactivate_user(user_id)
-                logger.info(f"Deactivated user {user_id}")
-        await asyncio.sleep(0.1) # Respect rate limits
-    
-    tasks = [send_message_to_user(user_id) for user_id in all_user_ids]
-    await asyncio.gather(*tasks)
-    
-    await update.message.reply_text(
-        f"📢 *Broadcast Finished*\n\n"
-        f"✅ Sent: {successful_sends}\n"
-        f"❌ Failed: {failed_sends}\n"
-        f"📊 Total Users: {len(all_user_ids)}",
-        parse_mode="Markdown"
-    ) 
\ No newline at end of file
+
+    # The broadcast is stored first, so it survives a restart, then sent in the background
+    broadcast_id = broadcast_repo.create(message.chat_id, message.message_id, user_repo.count_active_users())
+    if broadcast_id is None:
+        await message.reply_text("❌ Could not start the broadcast, please try again.")
+        return
+    broadcast = broadcast_repo.get(broadcast_id)
+    status_message = await message.reply_text(
+        broadcast_status_text(broadcast), parse_mode="Markdown", reply_markup=broadcast_keyboard(broadcast)
+    )
+    broadcast_repo.set_status_message(broadcast_id, status_message.chat_id, status_message.message_id)
+    start_broadcast(context.bot, broadcast_id)
+
+@admin_only
+async def broadcast_control_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Pauses, resumes or cancels a broadcast from the buttons under its progress message."""
+    action, _, broadcast_id = update.callback_query.data.removeprefix("broadcast_").partition(":")
+    status = {"pause": PAUSED, "resume": RUNNING, "cancel": CANCELLED}.get(action)
+    if status is None or not broadcast_id.isdigit():
+        return
+    set_broadcast_status(context.bot, int(broadcast_id), status)
+    broadcast = broadcast_repo.get(int(broadcast_id))
+    if broadcast:
+        await show_broadcast_status(context.bot, broadcast) 
\ No newline at end of file
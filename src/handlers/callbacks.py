@@ -1,16 +1,21 @@
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, WebAppInfo
 from telegram.ext import ContextTypes
 from datetime import datetime, time, date
 import pytz
 import random
 
+from src.config import WEBAPP_URL
 from src.database.user_repository import UserRepository
 from src.database.stats_repository import StatsRepository
 from src.utils import localization
 from src.utils.helpers import get_user_lang, get_zodiac_sign, calculate_weeks_passed
-from src.utils.image_generator import generate_life_table_image
+from src.utils.image_generator import choose_quote, life_table_cache_key
+from src.utils.render_service import render_service
+from src.utils.telegram_files import send_cached_photo
+from src.utils.render_cache import render_cache
+from src.utils.outbound import outbound_scheduler
 from src.handlers.commands import menu_command, choose_lang_command, ask_for_birthday
-from src.handlers.admin import manual_weekly_update_callback
+from src.handlers.admin import manual_weekly_update_callback, weekly_progress_callback, broadcast_control_callback
 
 user_repo = UserRepository()
 stats_repo = StatsRepository()
@@ -28,6 +33,10 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         await set_language_callback(update, context)
         return
 
+    if query.data.startswith("broadcast_"):
+        await broadcast_control_callback(update, context)
+        return
+
     routes = {
         "choose_lang": choose_lang_command,
         "main_menu": menu_command,
@@ -41,7 +50,8 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         "about_bot": about_bot_callback,
         "admin_analytics": admin_analytics_callback,
         "admin_broadcast": admin_broadcast_callback,
-        "admin_manual_weekly_update": manual_weekly_update_callback
+        "admin_manual_weekly_update": manual_weekly_update_callback,
+        "admin_weekly_progress": weekly_progress_callback
     }
 
     handler = routes.get(query.data)
@@ -115,14 +125,6 @@ async def get_table_action(update: Update, context: ContextTypes.DEFAULT_TYPE) -
     birthday_str = user.get('birthday')
     birthday = datetime.strptime(birthday_str, "%Y-%m-%d") if isinstance(birthday_str, str) else birthday_str
 
-    # --- Generate Image ---
-    image_bytes = generate_life_table_image(
-        birthday=birthday,
-        lang_code=lang_code,
-        locales=localization.LOCALES,
-        quotes=localization.QUOTES
-    )
-
     # --- Calculations ---
     now = datetime.now()
     delta = now - birthday
@@ -173,12 +175,27 @@ async def get_table_action(update: Update, context: ContextTypes.DEFAULT_TYPE) -
     )
 
     message = update.callback_query.message if update.callback_query else update.message
-    await message.reply_photo(photo=image_bytes, caption=text)
+    # --- Send Image (rendered only if it has not been uploaded before) ---
+    # The image's quote is chosen once, so the file_id key and the render agree on it
+    image_quote = choose_quote(localization.QUOTES, lang_code)
+    await send_cached_photo(
+        message.reply_photo,
+        life_table_cache_key(birthday, lang_code, localization.QUOTES, image_quote),
+        lambda: render_service.render(birthday, lang_code, image_quote),
+        caption=text
+    )
+
+def get_table_button(lang_code: str) -> InlineKeyboardButton:
+    """Opens the Mini App when it is configured, otherwise asks for the rendered PNG."""
+    text = localization.get_text("get_table_button", lang_code)
+    if WEBAPP_URL:
+        return InlineKeyboardButton(text, web_app=WebAppInfo(url=WEBAPP_URL))
+    return InlineKeyboardButton(text, callback_data="get_table")
 
 async def stats_menu_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     lang_code = get_user_lang(context)
     keyboard = [
-        [InlineKeyboardButton(localization.get_text("get_table_button", lang_code), callback_data="get_table")],
+        [get_table_button(lang_code)],
         [InlineKeyboardButton(localization.get_text("set_birthday_button", lang_code), callback_data="set_birthday_prompt")],
         [InlineKeyboardButton(localization.get_text("main_menu_button", lang_code), callback_data="main_menu")]
     ]
@@ -226,12 +243,22 @@ async def admin_analytics_callback(update: Update, context: ContextTypes.DEFAULT
         usage_stats = stats_repo.get_command_usage_stats()
         sorted_usage = sorted(usage_stats.items(), key=lambda item: item[1], reverse=True)
         usage_text = "\n".join([f"- `{cmd}`: {count}" for cmd, count in sorted_usage])
+        cache_stats = render_cache.stats()
+        lanes_text = "\n".join([
+            f"- `{name}`: {lane['sent']} sent, {lane['waiting']} waiting, share {lane['share']:.0%}, "
+            f"wait p95≤{lane['wait']['p95'] * 1000:.0f}ms, {lane['errors']} errors"
+            for name, lane in outbound_scheduler.stats().items()
+        ])
         analytics_text = (
             f"📊 *Bot Analytics*\n\n"
             f"*User Base:*\n- Total Users: {total_users}\n"
             f"- Users with Birthday: {users_with_bd} ({percentage_with_bd:.2f}%)\n\n"
             f"*New Users:*\n- Last 24h: {new_users_stats['24h']}\n"
             f"- Last 7d: {new_users_stats['7d']}\n- Last 30d: {new_users_stats['30d']}\n\n"
+            f"*Render Cache:*\n- Hit Rate: {cache_stats['hit_rate']:.1%} "
+            f"({cache_stats['hits'] + cache_stats['disk_hits']}/{cache_stats['hits'] + cache_stats['disk_hits'] + cache_stats['misses']})\n"
+            f"- Entries: {cache_stats['entries']} ({cache_stats['bytes'] / 1024 / 1024:.1f} MB)\n\n"
+            f"*Outbound Lanes:*\n{lanes_text}\n\n"
             f"*Command/Button Usage:*\n{usage_text}"
         )
         await update.callback_query.edit_message_text(text=analytics_text, parse_mode="Markdown")
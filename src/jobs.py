@@ -1,67 +1,444 @@
+import asyncio
 import logging
-import random
-from datetime import datetime
+import os
+import socket
+from collections import OrderedDict
+from datetime import date, datetime, time, timedelta
+from itertools import islice
+from time import perf_counter
+from typing import Iterable, Iterator, List, Optional, Tuple
 
 from telegram import Bot
 
-from .database.user_repository import UserRepository
+from .config import (
+    SPOOL_UPLOAD_CHAT_ID, SEND_CONCURRENCY, SEND_RATE, SEND_CHAT_INTERVAL,
+    WEEKLY_SEND_TIME, WEEKLY_SEND_SLOTS, WEEKLY_SLOT_MINUTES
+)
+from .database.user_repository import UserRepository, UserBirthday
+from .database.delivery_repository import DeliveryRepository
+from .database.shard_lease_repository import ShardLeaseRepository
+from .database.stats_repository import StatsRepository
 from .utils import localization
-from .utils.image_generator import generate_life_table_image
+from .utils.helpers import calculate_weeks_passed, iso_week_label
+from .utils.image_generator import RenderSpec, choose_quote, render_cache_key
+from .utils.render_service import render_service
+from .utils.telegram_files import get_cached_file_id, load_file_ids, remember_file_id, send_cached_photo
+from .utils.render_cache import render_cache
+from .utils.render_spool import render_spool
+from .utils.rate_limit import SendLimiter, is_permanent_send_error
+from .utils.run_metrics import RunMetrics
+from .utils.outbound import WEEKLY_LANE, lane_args
 
 logger = logging.getLogger(__name__)
 user_repo = UserRepository()
+delivery_repo = DeliveryRepository()
+stats_repo = StatsRepository()
+lease_repo = ShardLeaseRepository()
 
-async def send_weekly_update(bot: Bot) -> tuple[int, int]:
+# The weekly update goes out on Sundays (0=Monday, 6=Sunday).
+WEEKLY_SEND_WEEKDAY = 6
+# The same day for JobQueue.run_daily, whose days count from 0=Sunday
+WEEKLY_SEND_JOB_DAY = (WEEKLY_SEND_WEEKDAY + 1) % 7
+
+# Users are streamed from the database and rendered in batches of this size.
+USER_BATCH_SIZE = 1000
+
+# bot_data key of the weekly run's checkpoint: {"week": "YYYY-Www", "after_id": last finished user row id}
+WEEKLY_CHECKPOINT_KEY = "weekly_update_checkpoint"
+# bot_data key prefix of the progress snapshots (RunMetrics.snapshot) of weekly runs
+WEEKLY_PROGRESS_KEY = "weekly_update_progress"
+# Deliveries are written to the ledger at least this often, and whenever a batch finishes
+LEDGER_FLUSH_SIZE = 50
+# Weeks of delivery ledger kept for the record
+LEDGER_KEEP_WEEKS = 4
+
+# A worker holds a claimed shard this long (seconds) and renews it every third of that
+SHARD_LEASE_TTL = 300
+
+# Only one weekly run at a time; a second one waits and then finds everything done
+_weekly_update_lock = asyncio.Lock()
+
+def weekly_slot_times() -> List[time]:
+    """UTC start time of every weekly delivery slot, from WEEKLY_SEND_TIME on, WEEKLY_SLOT_MINUTES apart."""
+    hour, minute = (int(part) for part in WEEKLY_SEND_TIME.split(":"))
+    start = hour * 60 + minute
+    last = start + (WEEKLY_SEND_SLOTS - 1) * WEEKLY_SLOT_MINUTES
+    if last >= 24 * 60:
+        # A slot after midnight would fall on another day, and possibly another ISO week
+        raise ValueError(f"The last weekly slot starts after midnight ({WEEKLY_SEND_SLOTS} slots from {WEEKLY_SEND_TIME})")
+    return [
+        time(hour=offset // 60, minute=offset % 60)
+        for offset in range(start, last + 1, WEEKLY_SLOT_MINUTES or 1)
+    ]
+
+def _next_send_day(today: date = None) -> date:
+    today = today or date.today()
+    return today + timedelta(days=(WEEKLY_SEND_WEEKDAY - today.weekday()) % 7)
+
+def _user_batches(
+    batch_size: int = USER_BATCH_SIZE,
+    after_id: int = 0,
+    shard: Optional[Tuple[int, int]] = None,
+    slot: Optional[Tuple[int, int]] = None,
+    metrics: RunMetrics = None
+) -> Iterator[List[UserBirthday]]:
+    users = user_repo.iter_users_with_birthday(batch_size, after_id, shard, slot)
+    while True:
+        started = perf_counter()
+        batch = list(islice(users, batch_size))
+        if metrics:
+            metrics.observe("fetch", perf_counter() - started)
+        if not batch:
+            return
+        yield batch
+
+def _weekly_specs(users: Iterable[UserBirthday], day: date) -> List[RenderSpec]:
+    """One render spec per user; `tag` carries (telegram_id, birthday)."""
+    specs = []
+    for user in users:
+        birthday = datetime(user.birthday.year, user.birthday.month, user.birthday.day)
+        lang_code = user.language or 'uz'
+        specs.append(RenderSpec(
+            lang_code,
+            calculate_weeks_passed(birthday, day),
+            choose_quote(localization.QUOTES, lang_code, day=day),
+            (user.telegram_id, birthday)
+        ))
+    return specs
+
+class _SendPipeline:
+    """
+    Producer/consumer send pipeline: the job queues (spec, key, image_bytes) and
+    `concurrency` sender tasks send them, all through one SendLimiter.
+
+    Sends are grouped into user batches (open_batch/close_batch). Successful sends
+    go to the delivery ledger of `week`, and once a batch and every batch before it
+    is finished, the weekly checkpoint moves past its last user row id. Permanent
+    failures go to the dead letters and their users are deactivated with them, also
+    when the run is cancelled; `unreachable` collects those users.
+    Send and database timings and the outcome of every send go to `metrics`.
+    """
+
+    def __init__(
+        self, bot: Bot, week: str, checkpoint_key: str, metrics: RunMetrics, concurrency: int = SEND_CONCURRENCY
+    ):
+        self.bot = bot
+        self.week = week
+        self.checkpoint_key = checkpoint_key
+        self.metrics = metrics
+        self.concurrency = max(1, concurrency)
+        self.limiter = SendLimiter(SEND_RATE, SEND_CHAT_INTERVAL)
+        # Weekly sends yield to interactive replies in the bot's outbound scheduler
+        self.lane_args = lane_args(bot, WEEKLY_LANE)
+        self.queue = asyncio.Queue(maxsize=self.concurrency * 4)
+        self.upload_locks = {}
+        self.sent = 0
+        self._senders = []
+        self._batches = OrderedDict()  # batch cursor -> [sends in flight, closed]
+        self._batch = None
+        self._delivered = []
+        self._dead_letters = []
+        self.unreachable = []
+
+    async def __aenter__(self) -> "_SendPipeline":
+        self._senders = [asyncio.create_task(self._sender()) for _ in range(self.concurrency)]
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        try:
+            for _ in self._senders:
+                await self.queue.put(None)
+            await asyncio.gather(*self._senders)
+        finally:
+            # Record what was sent even when the run is cancelled
+            self._flush_deliveries()
+
+    def open_batch(self, cursor: int) -> None:
+        """Starts a batch of users ending at row id `cursor`; put() adds to it until it is closed."""
+        self._batch = cursor
+        self._batches[cursor] = [0, False]
+
+    def close_batch(self) -> None:
+        self._batches[self._batch][1] = True
+        self._advance()
+
+    async def put(self, spec: RenderSpec, key: str, image_bytes: bytes = None) -> None:
+        self._batches[self._batch][0] += 1
+        await self.queue.put((spec, key, image_bytes, self._batch))
+
+    def _flush_deliveries(self) -> None:
+        if not self._delivered and not self._dead_letters:
+            return
+        with self.metrics.timed("db"):
+            if self._delivered:
+                delivery_repo.record_deliveries(self.week, self._delivered)
+                self._delivered = []
+            if self._dead_letters:
+                delivery_repo.record_dead_letters(f"weekly_update:{self.week}", self._dead_letters)
+                # Users who blocked the bot or deleted their account are not retried next week
+                user_repo.deactivate_users([user_id for user_id, _ in self._dead_letters])
+                self._dead_letters = []
+
+    def _advance(self) -> None:
+        cursor = None
+        while self._batches:
+            first, (in_flight, closed) = next(iter(self._batches.items()))
+            if in_flight or not closed:
+                break
+            del self._batches[first]
+            cursor = first
+        if cursor is not None:
+            # The ledger is written before the checkpoint moves past its users
+            self._flush_deliveries()
+            with self.metrics.timed("db"):
+                stats_repo.set_bot_data(self.checkpoint_key, {"week": self.week, "after_id": cursor})
+
+    async def _sender(self) -> None:
+        while True:
+            item = await self.queue.get()
+            if item is None:
+                return
+            spec, key, image_bytes, batch = item
+            user_id = spec.tag[0]
+            try:
+                await self._send(spec, key, image_bytes)
+            except Exception as e:
+                self.metrics.record_error(e)
+                if is_permanent_send_error(e):
+                    logger.warning(f"User {user_id} cannot receive the weekly update: {e}")
+                    self._dead_letters.append((user_id, str(e)))
+                    self.unreachable.append(user_id)
+                else:
+                    logger.error(f"Failed to send weekly update to user {user_id}: {e}")
+            else:
+                logger.info(f"Sent weekly update to user {user_id}")
+                self.sent += 1
+                self.metrics.record_sent()
+                self._delivered.append(user_id)
+                if len(self._delivered) >= LEDGER_FLUSH_SIZE:
+                    self._flush_deliveries()
+            self._batches[batch][0] -= 1
+            self._advance()
+
+    async def _send(self, spec: RenderSpec, key: str, image_bytes: bytes = None) -> None:
+        """Sends one user their weekly table. Failures are raised."""
+        user_id, birthday = spec.tag
+        lang_code = spec.lang_code
+
+        # Prepare caption
+        weeks_passed = (datetime.now() - birthday).days // 7
+        caption = localization.get_text("table_caption", lang_code).format(weeks_passed=weeks_passed)
+
+        # The caption repeats the quote drawn on the image, chosen with its render key
+        if spec.quote:
+            quote_title = localization.get_text("weekly_update.quote_of_the_week", lang_code)
+            caption += f"\n\n{quote_title}:\n{spec.quote}"
+
+        async def render() -> bytes:
+            # Only needed when there are no bytes yet or a cached file_id was rejected
+            if image_bytes is not None:
+                return image_bytes
+            return await render_service.render(birthday, lang_code, spec.quote)
+
+        async def timed_send_photo(**kwargs):
+            # Times the Telegram call itself, not the wait for the rate limiter
+            with self.metrics.timed("upload"):
+                return await self.bot.send_photo(**kwargs, **self.lane_args)
+
+        async def send_photo(**kwargs):
+            return await self.limiter.call(user_id, timed_send_photo, **kwargs)
+
+        # The run loaded every known file_id up front, a miss needs no database lookup
+        if not get_cached_file_id(key, lookup=False):
+            # The first sender of an image uploads it, the others wait and reuse its file_id
+            async with self.upload_locks.setdefault(key, asyncio.Lock()):
+                if not get_cached_file_id(key, lookup=False):
+                    await send_cached_photo(send_photo, key, render, lookup=False, chat_id=user_id, caption=caption)
+                    return
+        await send_cached_photo(send_photo, key, render, lookup=False, chat_id=user_id, caption=caption)
+
+async def send_weekly_update(
+    bot: Bot, shard: Optional[Tuple[int, int]] = None, slot: Optional[Tuple[int, int]] = None
+) -> tuple[int, int]:
     """
-    Sends a weekly life table update to all users who have set their birthday.
-    Returns a tuple of (successful_sends, total_users).
+    Sends a weekly life table update to all users who have set their birthday,
+    or with `shard` (index, count) only to those with telegram_id % count == index,
+    and with `slot` (index, count) only to those of that delivery slot.
+    Returns a tuple of (users who got this week's update, total_users).
+
+    Safe to restart or repeat: the run resumes after this week's checkpoint and
+    skips users the delivery ledger already has for this week.
     """
-    logger.info("Running weekly update job...")
+    # The job queue and the admin button pass a CallbackContext, run_weekly_job.py a Bot.
+    bot = getattr(bot, "bot", bot)
+    async with _weekly_update_lock:
+        return await _run_weekly_update(bot, shard, slot)
+
+async def send_weekly_slot(context) -> tuple[int, int]:
+    """Job queue callback of one weekly delivery slot; the slot index is the job's data."""
+    return await send_weekly_update(context, slot=(context.job.data, WEEKLY_SEND_SLOTS))
+
+async def _run_weekly_update(
+    bot: Bot, shard: Optional[Tuple[int, int]], slot: Optional[Tuple[int, int]]
+) -> tuple[int, int]:
+    parts = []
+    if shard:
+        parts.append(f"shard {shard[0]}/{shard[1]}")
+    if slot:
+        parts.append(f"slot {slot[0]}/{slot[1]}")
+    scope = f" ({', '.join(parts)})" if parts else ""
+    logger.info(f"Running weekly update job{scope}...")
     
-    users_with_birthday = user_repo.get_users_with_birthday()
-    total_users = len(users_with_birthday)
-    successful_sends = 0
+    total_users = user_repo.count_users_with_birthday(shard, slot)
     
     if not total_users:
         logger.info("No users with birthdays found. Skipping weekly update.")
         return 0, 0
 
-    for user in users_with_birthday:
-        try:
-            user_id = user['telegram_id']
-            lang_code = user.get('language', 'uz')
-            birthday_str = user.get('birthday')
-            
-            if not birthday_str:
-                continue
-
-            birthday = datetime.fromisoformat(birthday_str.split(" ")[0])
-
-            # Generate image
-            image_bytes = generate_life_table_image(
-                birthday=birthday,
-                lang_code=lang_code,
-                locales=localization.LOCALES,
-                quotes=localization.QUOTES
-            )
-            
-            # Prepare caption
-            weeks_passed = (datetime.now() - birthday).days // 7
-            caption = localization.get_text("table_caption", lang_code).format(weeks_passed=weeks_passed)
-            
-            # Add a random quote to the caption
-            lang_quotes = localization.QUOTES.get(lang_code, [])
-            if lang_quotes:
-                quote = random.choice(lang_quotes)
-                quote_title = localization.get_text("weekly_update.quote_of_the_week", lang_code)
-                caption += f"\n\n{quote_title}:\n{quote}"
-
-            await bot.send_photo(chat_id=user_id, photo=image_bytes, caption=caption)
-            logger.info(f"Sent weekly update to user {user_id}")
-            successful_sends += 1
-            
-        except Exception as e:
-            logger.error(f"Failed to send weekly update to user {user.get('telegram_id')}: {e}")
-            
-    logger.info(f"Weekly update job finished. Sent to {successful_sends}/{total_users} users.")
-    return successful_sends, total_users 
\ No newline at end of file
+    today = date.today()
+    week = iso_week_label(today)
+    delivery_repo.prune(iso_week_label(today - timedelta(weeks=LEDGER_KEEP_WEEKS)))
+    # Old file_ids are dropped and the rest loaded once, instead of a lookup per user
+    load_file_ids()
+    # Every shard and slot layout keeps its own checkpoint and progress, the ledger is shared
+    key_suffix = ""
+    if shard:
+        key_suffix += f":{shard[0]}/{shard[1]}"
+    if slot:
+        key_suffix += f":slot{slot[0]}/{slot[1]}"
+    checkpoint_key = WEEKLY_CHECKPOINT_KEY + key_suffix
+    checkpoint = stats_repo.get_bot_data(checkpoint_key)
+    after_id = checkpoint["after_id"] if isinstance(checkpoint, dict) and checkpoint.get("week") == week else 0
+    remaining_users = total_users
+    if after_id:
+        logger.info(f"Resuming the weekly update of {week}{scope} after user row {after_id}")
+        remaining_users = user_repo.count_users_with_birthday(shard, slot, after_id)
+
+    # Progress and stage timings are published to bot_data for the admin panel and /metrics
+    metrics = RunMetrics(
+        f"{week}{scope}", remaining_users,
+        publish=lambda snapshot: stats_repo.set_bot_data(WEEKLY_PROGRESS_KEY + key_suffix, snapshot)
+    )
+    metrics.maybe_publish(force=True)
+
+    def on_render_timing(paint_seconds: float, encode_seconds: float) -> None:
+        metrics.observe("render", paint_seconds)
+        metrics.observe("encode", encode_seconds)
+
+    # Images uploaded before are sent by file_id and pre-staged ones from the spool,
+    # the rest is rendered once per distinct image and sent as renders finish.
+    staged = render_spool.get_index(today)
+    skipped = 0
+    async with _SendPipeline(bot, week, checkpoint_key, metrics) as pipeline:
+        # Users are streamed in batches, so sending starts with the first batch
+        for users in _user_batches(after_id=after_id, shard=shard, slot=slot, metrics=metrics):
+            with metrics.timed("fetch"):
+                delivered = delivery_repo.get_delivered(week, (user.telegram_id for user in users))
+            skipped += len(delivered)
+            metrics.record_skipped(len(delivered))
+            pipeline.open_batch(users[-1].id)
+            to_render = []
+            for spec in _weekly_specs((user for user in users if user.telegram_id not in delivered), today):
+                entry = staged.get(spec.tag[0])
+                if entry and len(entry) == 4 and tuple(entry[1:3]) == (spec.lang_code, spec.weeks_passed):
+                    # The staged image is sent with the quote it was rendered with (they
+                    # differ with QUOTE_MODE=random), so the caption matches the image
+                    key, spec = entry[0], spec._replace(quote=entry[3])
+                else:
+                    key = render_cache_key(spec.lang_code, spec.weeks_passed, spec.quote)
+                if get_cached_file_id(key, lookup=False):
+                    await pipeline.put(spec, key)
+                    continue
+                image_bytes = render_spool.get_image(today, key)
+                if image_bytes is not None:
+                    await pipeline.put(spec, key, image_bytes)
+                else:
+                    to_render.append(spec)
+
+            async for key, group, image_bytes in render_service.render_many(to_render, on_render_timing):
+                for spec in group:
+                    await pipeline.put(spec, key, image_bytes)
+            pipeline.close_batch()
+    metrics.finish()
+    successful_sends = delivery_repo.count_delivered(week, shard, slot) or pipeline.sent
+
+    if pipeline.limiter.retry_afters:
+        logger.warning(f"Flood control paused the weekly update {pipeline.limiter.retry_afters} time(s)")
+    if pipeline.unreachable:
+        logger.info(f"Deactivated {len(pipeline.unreachable)} users who cannot be reached.")
+    if skipped:
+        logger.info(f"Skipped {skipped} users who already had the update of {week}.")
+    logger.info(f"Weekly update job{scope} finished. Sent to {pipeline.sent} users, {successful_sends}/{total_users} have the update of {week}.")
+    logger.info(f"Render cache: {render_cache.stats()}")
+    return successful_sends, total_users 
+
+async def run_sharded_weekly_update(bot: Bot, shard_count: int, owner: str = None) -> tuple[int, int]:
+    """
+    Splits this week's update into `shard_count` shards and sends the ones this
+    worker can claim, one after another, until every shard is done or leased by
+    another worker. Any number of workers can run this at once against the same
+    database. Returns (successful_sends, total_users) over the shards sent here.
+    """
+    bot = getattr(bot, "bot", bot)
+    owner = owner or f"{socket.gethostname()}:{os.getpid()}"
+    week = iso_week_label(date.today())
+    successful_sends = total_users = 0
+    while (shard := lease_repo.claim(week, shard_count, owner, SHARD_LEASE_TTL)) is not None:
+        logger.info(f"{owner} claimed shard {shard}/{shard_count} of {week}")
+        run = asyncio.create_task(send_weekly_update(bot, (shard, shard_count)))
+        lost = False
+        while not run.done():
+            await asyncio.wait({run}, timeout=SHARD_LEASE_TTL / 3)
+            if not run.done() and not lease_repo.renew(week, shard_count, shard, owner, SHARD_LEASE_TTL):
+                logger.error(f"Lost the lease on shard {shard}/{shard_count} of {week}, stopping it")
+                lost = True
+                run.cancel()
+                await asyncio.gather(run, return_exceptions=True)
+        if lost:
+            continue
+        shard_sends, shard_users = run.result()
+        successful_sends += shard_sends
+        total_users += shard_users
+        lease_repo.finish(week, shard_count, shard, owner)
+    logger.info(f"{owner} found no more shards of {week} to claim")
+    return successful_sends, total_users
+
+async def prestage_weekly_update(bot: Bot, day: date = None) -> int:
+    """
+    Renders every user's table for the next weekly update (or `day`) into the
+    render spool ahead of the send window. With SPOOL_UPLOAD_CHAT_ID set each
+    distinct image is also uploaded once, so the send window only reuses file_ids.
+    Returns the number of staged users.
+    """
+    bot = getattr(bot, "bot", bot)
+    day = day or _next_send_day()
+    logger.info(f"Pre-staging weekly update for {day}...")
+    render_spool.prune(day)
+    load_file_ids()
+
+    index = {}
+    uploaded = 0
+    for users in _user_batches():
+        to_render = []
+        for spec in _weekly_specs(users, day):
+            key = render_cache_key(spec.lang_code, spec.weeks_passed, spec.quote)
+            index[spec.tag[0]] = (key, spec.lang_code, spec.weeks_passed, spec.quote)
+            if not get_cached_file_id(key, lookup=False) and render_spool.get_image(day, key) is None:
+                to_render.append(spec)
+
+        async for key, group, image_bytes in render_service.render_many(to_render):
+            render_spool.put_image(day, key, image_bytes)
+            if SPOOL_UPLOAD_CHAT_ID:
+                try:
+                    message = await bot.send_photo(
+                        chat_id=SPOOL_UPLOAD_CHAT_ID, photo=image_bytes, disable_notification=True,
+                        **lane_args(bot, WEEKLY_LANE)
+                    )
+                    remember_file_id(key, message)
+                    uploaded += 1
+                except Exception as e:
+                    logger.error(f"Failed to pre-upload image {key}: {e}")
+
+    render_spool.write_index(day, index)
+    logger.info(f"Pre-staging finished. Staged {len(index)} users, uploaded {uploaded} images.")
+    return len(index)
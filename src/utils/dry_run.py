@@ -0,0 +1,84 @@
+import asyncio
+import os
+import random
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from sqlalchemy import insert
+from telegram.error import BadRequest, Forbidden, RetryAfter, TimedOut
+
+from src.database import database
+from src.database.models import User
+from . import localization
+
+# Errors the fake bot injects, roughly in the mix a bulk send sees
+_INJECTED_ERRORS = (
+    lambda: Forbidden("Forbidden: bot was blocked by the user"),
+    lambda: Forbidden("Forbidden: bot was blocked by the user"),
+    lambda: BadRequest("Chat not found"),
+    lambda: TimedOut(),
+    lambda: RetryAfter(1),
+)
+
+
+class FakeBot:
+    """
+    Stands in for telegram.Bot in dry runs of the weekly job. send_photo waits
+    `latency` seconds, plus `upload_latency` when the photo is uploaded as bytes
+    instead of sent by file_id, with +-50% jitter, and fails with probability
+    `error_rate` with one of the errors Telegram answers bulk sends with.
+    """
+
+    def __init__(self, latency: float = 0.05, upload_latency: float = 0.3, error_rate: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.upload_latency = upload_latency
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self.calls = 0
+        self.uploads = 0
+        self.send_seconds = 0.0
+        self.errors = Counter()
+
+    async def send_photo(self, chat_id: int, photo, caption: str = None, **kwargs):
+        self.calls += 1
+        upload = not isinstance(photo, str)
+        delay = self.latency + (self.upload_latency if upload else 0)
+        started = time.perf_counter()
+        await asyncio.sleep(delay * self._random.uniform(0.5, 1.5))
+        self.send_seconds += time.perf_counter() - started
+        if self._random.random() < self.error_rate:
+            error = self._random.choice(_INJECTED_ERRORS)()
+            self.errors[type(error).__name__] += 1
+            raise error
+        if upload:
+            self.uploads += 1
+        return SimpleNamespace(photo=[SimpleNamespace(file_id=f"dry-run-{self.calls}")])
+
+
+def use_temporary_database() -> str:
+    """Points the bot database at a new, empty SQLite file in a temporary directory and returns its path."""
+    path = os.path.join(tempfile.mkdtemp(prefix="life-table-dry-run-"), "dry_run.db")
+    database.configure_database(f"sqlite:///{path}")
+    return path
+
+
+def seed_users(count: int, seed: int = 0, chunk_size: int = 10000) -> None:
+    """Inserts `count` synthetic users with random telegram_ids, languages and birthdays."""
+    rng = random.Random(seed)
+    languages = list(localization.LOCALES.get("languages", {"uz": "O'zbekcha"}))
+    telegram_ids = rng.sample(range(10**8, 8 * 10**9), count)
+    first_birthday = datetime(1950, 1, 1)
+    for start in range(0, count, chunk_size):
+        with database.DatabaseSession() as session:
+            session.execute(insert(User), [
+                {
+                    "telegram_id": telegram_id,
+                    "language": rng.choice(languages),
+                    "birthday": first_birthday + timedelta(days=rng.randrange(60 * 365)),
+                    "is_active": True,
+                }
+                for telegram_id in telegram_ids[start:start + chunk_size]
+            ])
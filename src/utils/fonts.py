@@ -0,0 +1,33 @@
+from PIL import ImageFont
+import logging
+from typing import Iterable
+
+logger = logging.getLogger(__name__)
+
+# Loaded fonts keyed by (path, size). Parsing the TTF and setting up FreeType
+# is done once per process instead of on every render.
+_FONTS = {}
+
+
+def get_font(font_path: str, size: int):
+    """Returns the font for (path, size), loading it on first use. Falls back to PIL's default font."""
+    key = (font_path, size)
+    font = _FONTS.get(key)
+    if font is None:
+        try:
+            font = ImageFont.truetype(font_path, size=size)
+        except (IOError, OSError):
+            logger.warning(f"Could not load font {font_path}, using the default font")
+            font = ImageFont.load_default()
+        _FONTS[key] = font
+    return font
+
+
+def preload_fonts(font_path: str, sizes: Iterable[int]) -> None:
+    """Loads a font in all the given sizes ahead of time, e.g. at startup or in a worker initializer."""
+    for size in sizes:
+        get_font(font_path, size)
+
+
+def clear_fonts() -> None:
+    _FONTS.clear()
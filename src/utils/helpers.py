@@ -22,15 +22,16 @@ def get_user_lang(context: ContextTypes.DEFAULT_TYPE) -> str:
     
     return 'uz'
 
-def calculate_weeks_passed(birthday: datetime) -> int:
+def calculate_weeks_passed(birthday: datetime, today=None) -> int:
     """
     Calculate the number of weeks passed since birthday.
     This function correctly calculates weeks by considering the birthday as week 0.
     Takes into account leap years for accurate calculation.
+    `today` can be set to calculate for another date than the current one.
     """
     from datetime import date
     
-    today = date.today()
+    today = today or date.today()
     birth_date = birthday.date()
     
     # If birthday is today or in the future, return 0
@@ -45,6 +46,11 @@ def calculate_weeks_passed(birthday: datetime) -> int:
     
     return weeks_passed
 
+def iso_week_label(day) -> str:
+    """Returns the ISO week of `day` as "YYYY-Www", e.g. "2026-W42"."""
+    iso_year, iso_week, _ = day.isocalendar()
+    return f"{iso_year}-W{iso_week:02d}"
+
 def get_zodiac_sign(day: int, month: int) -> str:
     """Determines the zodiac sign based on day and month."""
     if month == 12:
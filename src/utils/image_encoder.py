@@ -0,0 +1,106 @@
+import io
+from typing import Iterable, Tuple
+
+import numpy as np
+from PIL import Image
+
+from src.config import IMAGE_FORMAT, IMAGE_PALETTE, IMAGE_COMPRESS_LEVEL, IMAGE_QUALITY
+
+FORMATS = ("png", "webp", "jpeg")
+
+
+class ImageEncoder:
+    """
+    Turns a rendered canvas into the bytes that are sent to Telegram.
+
+    png:  lossless; with `palette` the canvas is kept in "P" mode with a fixed
+          colour table, which is smaller and much faster to compress.
+          `compress_level` is the zlib level (0-9).
+    webp: `quality` 1-99 is lossy, 100 is lossless.
+    jpeg: `quality` 1-95.
+    """
+
+    def __init__(self, fmt: str = "png", palette: bool = True, compress_level: int = 6, quality: int = 90):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unsupported image format '{fmt}', expected one of {FORMATS}")
+        self.format = fmt
+        self.palette = palette and fmt == "png"
+        self.compress_level = compress_level
+        self.quality = quality
+
+    @property
+    def signature(self) -> str:
+        """Identifies the encoder settings in render cache keys."""
+        if self.format == "png":
+            return f"png:{'p' if self.palette else 'rgb'}:{self.compress_level}"
+        return f"{self.format}:{self.quality}"
+
+    @property
+    def extension(self) -> str:
+        return "jpg" if self.format == "jpeg" else self.format
+
+    def encode(self, img: Image.Image) -> bytes:
+        """
+        Returns the encoded image. BytesIO.getvalue() hands over its buffer without
+        copying it and python-telegram-bot sends `bytes` as they are, so pass the
+        result on directly rather than wrapping it in a file object again.
+        """
+        output = io.BytesIO()
+        if self.format == "png":
+            if img.mode == "P" and not self.palette:
+                img = img.convert("RGB")
+            img.save(output, format="PNG", compress_level=self.compress_level)
+        else:
+            if img.mode != "RGB":
+                img = img.convert("RGB")
+            if self.format == "webp":
+                img.save(output, format="WEBP", quality=self.quality, lossless=self.quality >= 100)
+            else:
+                img.save(output, format="JPEG", quality=self.quality)
+        return output.getvalue()
+
+
+class FixedPalette:
+    """
+    Exact RGB -> "P" conversion against a fixed colour table. Greys are looked
+    up by their single channel value, the few other colours by comparison, so
+    mostly-grey areas such as antialiased text convert in one table lookup.
+    Colours missing from the table map to their nearest entry.
+    """
+
+    def __init__(self, colors: Iterable[Tuple[int, int, int]]):
+        self.colors = np.array(list(dict.fromkeys(colors)), dtype=np.int32)
+        if len(self.colors) > 256:
+            raise ValueError("A palette holds at most 256 colours")
+        self._flat_palette = self.colors.astype(np.uint8).flatten().tolist()
+        greys = np.arange(256, dtype=np.int32)[:, None].repeat(3, axis=1)
+        self._grey_lut = self._nearest(greys).astype(np.uint8)
+
+    def _nearest(self, rgb: np.ndarray) -> np.ndarray:
+        distances = ((rgb[:, None, :] - self.colors[None, :, :]) ** 2).sum(axis=2)
+        return distances.argmin(axis=1)
+
+    def convert(self, img: Image.Image) -> Image.Image:
+        rgb = np.asarray(img.convert("RGB"))
+        red = rgb[..., 0]
+        indices = self._grey_lut[red]
+        not_grey = (red != rgb[..., 1]) | (red != rgb[..., 2])
+        if not_grey.any():
+            others = rgb[not_grey].astype(np.int32)
+            unique, inverse = np.unique(others, axis=0, return_inverse=True)
+            indices[not_grey] = self._nearest(unique).astype(np.uint8)[inverse.ravel()]
+        return self.image(indices)
+
+    def index(self, color: Tuple[int, int, int]) -> int:
+        """The table entry `color` maps to."""
+        return int(self._nearest(np.array([color], dtype=np.int32))[0])
+
+    def image(self, indices: np.ndarray) -> Image.Image:
+        """A "P" image of this palette from an array of table indices."""
+        result = Image.fromarray(indices.astype(np.uint8, copy=False), "P")
+        result.putpalette(self._flat_palette)
+        return result
+
+
+# Encoder configured for the bot.
+encoder = ImageEncoder(IMAGE_FORMAT, IMAGE_PALETTE, IMAGE_COMPRESS_LEVEL, IMAGE_QUALITY)
@@ -1,66 +1,238 @@
-from PIL import Image, ImageDraw, ImageFont, ImageOps
-from datetime import datetime
-import io
+from PIL import Image, ImageColor, ImageDraw, ImageOps
+from datetime import datetime, date
+import hashlib
 import textwrap
 import random
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Tuple
+import numpy as np
+from src.config import QUOTE_MODE
+from . import fonts
+from .fonts import get_font
 from .helpers import calculate_weeks_passed
+from .image_encoder import FixedPalette, ImageEncoder, encoder as default_encoder
+from .life_grid import COLS, ROWS, CELL_STATES, LifeGrid, cell_states, packed_grid
+from .render_cache import render_cache
 
+DEFAULT_FONT_PATH = "assets/NotoSans-Regular.ttf"
 
-def generate_life_table_image(
-    birthday: datetime,
-    lang_code: str,
-    locales: dict,
-    quotes: dict,
-    font_path: str = "assets/NotoSans-Regular.ttf"
-) -> bytes:
-    
+# Bump whenever the layout or colours change, so cached renders are not reused.
+# Encoder settings are part of the cache key on their own.
+RENDER_VERSION = 1
+
+# --- Layout ---
+BOX_SIZE = 12
+BOX_PADDING_X, BOX_PADDING_Y = 3, 4  # Horizontal and vertical padding
+MARGIN = {
+    "top": 170, "bottom": 220, "left": 180, "right": 50
+}
+IMG_WIDTH = MARGIN["left"] + COLS * (BOX_SIZE + BOX_PADDING_X) - BOX_PADDING_X + MARGIN["right"]
+IMG_HEIGHT = MARGIN["top"] + ROWS * (BOX_SIZE + BOX_PADDING_Y) - BOX_PADDING_Y + MARGIN["bottom"]
+
+# --- Colors ---
+COLORS = {
+    "text": "#333333", "outline": "#cccccc", "arrow": "#000000",
+    "footer": "#aaaaaa",
+    "childhood_adolescence": "#89cff0",  # Light Blue for 0-17
+    "young_adulthood": "#90ee90",       # Light Green for 18-39
+    "middle_age": "#ffd700",           # Gold for 40-64
+    "seniority": "#da70d6",            # Orchid for 65-90
+    "current_week": "#ff4500",
+    "future": "#ffffff"
+}
+
+# Fixed colour table for palette output: the flat colours plus every grey that
+# the dark text can blend to when it is antialiased onto white.
+PALETTE = FixedPalette(
+    [ImageColor.getrgb(color) for color in COLORS.values()]
+    + [(v, v, v) for v in range(ImageColor.getrgb(COLORS["text"])[0], 256)]
+)
+
+FONT_SIZES = {
+    "title": 40, "axis": 30, "label": 22, "legend": 24, "quote": 28, "footer": 20
+}
+
+CELL_PITCH_X = BOX_SIZE + BOX_PADDING_X
+CELL_PITCH_Y = BOX_SIZE + BOX_PADDING_Y
+GRID_BOX = (
+    MARGIN["left"], MARGIN["top"],
+    MARGIN["left"] + COLS * CELL_PITCH_X, MARGIN["top"] + ROWS * CELL_PITCH_Y
+)
+
+# Area of the canvas the quote is drawn in, restored from the base layer on every draw.
+QUOTE_BOX = (0, IMG_HEIGHT - 90, IMG_WIDTH, IMG_HEIGHT)
+
+# Pre-rendered static canvases (title, axes, legend, footer and an empty grid),
+# keyed by (lang_code, font_path). They only depend on the language, so they are
+# drawn once and every render starts from a copy.
+_BASE_LAYERS = {}
+
+# Palette ("P" mode) copies of the cached RGB layers, used for palette output.
+_PALETTE_LAYERS = {}
+
+# Serialises the lazy building of cached layers, so renders running in parallel
+# threads build each layer once instead of all at the same time.
+_LAYERS_LOCK = threading.RLock()
+
+
+def _in_mode(key: tuple, img: Image.Image, palette: bool) -> Image.Image:
+    """Returns the cached layer itself, or its palette copy when `palette` is set."""
+    if not palette:
+        return img
+    converted = _PALETTE_LAYERS.get(key)
+    if converted is None:
+        with _LAYERS_LOCK:
+            converted = _PALETTE_LAYERS.get(key)
+            if converted is None:
+                converted = PALETTE.convert(img)
+                _PALETTE_LAYERS[key] = converted
+    return converted
+
+
+def _get_text(locales: dict, lang_code: str, key: str, default: str = None) -> str:
+    try:
+        keys = key.split('.')
+        value = locales
+        for k in keys:
+            value = value[k]
+        return value.get(lang_code, value.get('en', default or f"_{key}_"))
+    except (KeyError, AttributeError):
+        return default or f"_{key}_"
+
+
+def _load_fonts(font_path: str) -> dict:
+    return {name: get_font(font_path, size) for name, size in FONT_SIZES.items()}
+
+
+def preload_fonts(font_path: str = DEFAULT_FONT_PATH) -> None:
+    """Loads every font size the layout uses into the font registry."""
+    fonts.preload_fonts(font_path, FONT_SIZES.values())
+
+
+# Pre-drawn cell tiles by palette flag: RGB pixels, or palette indices.
+_CELL_TILES = {}
+
+
+def _cell_tiles(palette: bool = False) -> np.ndarray:
+    """
+    Returns one pre-drawn (BOX_SIZE + 1)² tile per cell state, drawn exactly like
+    a grid cell, as RGB pixels or, with `palette`, as indices into PALETTE.
+    """
+    tiles = _CELL_TILES.get(palette)
+    if tiles is None:
+        tiles = []
+        for state in CELL_STATES:
+            tile = Image.new("RGB", (BOX_SIZE + 1, BOX_SIZE + 1), "white")
+            ImageDraw.Draw(tile).rectangle([0, 0, BOX_SIZE, BOX_SIZE], fill=COLORS[state], outline=COLORS["outline"], width=1)
+            # A tile has a handful of colours, converting it is cheap, unlike a whole grid
+            tiles.append(np.asarray(PALETTE.convert(tile) if palette else tile))
+        tiles = _CELL_TILES[palette] = np.stack(tiles)
+    return tiles
+
+
+def _grid_image(states: np.ndarray, palette: bool = False) -> Image.Image:
+    """
+    Builds the grid area for the given cell states by copying state tiles into a
+    NumPy view of it. With `palette` the tiles are palette indices and the grid is
+    built in "P" mode directly, instead of converting the finished RGB grid.
+    """
+    tiles = _cell_tiles(palette)
+    height, width = GRID_BOX[3] - GRID_BOX[1], GRID_BOX[2] - GRID_BOX[0]
+    if palette:
+        grid = np.full((height, width), PALETTE.index((255, 255, 255)), dtype=np.uint8)
+        cells = grid.reshape(ROWS, CELL_PITCH_Y, COLS, CELL_PITCH_X)
+    else:
+        grid = np.full((height, width, 3), 255, dtype=np.uint8)
+        cells = grid.reshape(ROWS, CELL_PITCH_Y, COLS, CELL_PITCH_X, 3)
+    # Week index = year * ROWS + week_of_year, so years are the outer axis.
+    states = states.reshape(COLS, ROWS).T
+    cells[:, :BOX_SIZE + 1, :, :BOX_SIZE + 1] = np.swapaxes(tiles[states], 1, 2)
+    return PALETTE.image(grid) if palette else Image.fromarray(grid)
+
+
+# Pre-built grid areas by (name, palette flag)
+_GRID_LAYERS = {}
+
+
+def _grid_layer(name: str, palette: bool = False) -> Image.Image:
+    """
+    Returns a pre-built grid area: "lived" has every week in its life-stage
+    colour, "empty" has every week as a future week, "current" is a single
+    current week tile. Palette layers are built from palette tiles.
+    """
+    key = (name, palette)
+    layer = _GRID_LAYERS.get(key)
+    if layer is None:
+        with _LAYERS_LOCK:
+            layer = _GRID_LAYERS.get(key)
+            if layer is None:
+                if name == "lived":
+                    layer = _grid_image(cell_states(COLS * ROWS), palette)
+                elif name == "current":
+                    tile = _cell_tiles(palette)[CELL_STATES.index("current_week")]
+                    layer = PALETTE.image(tile) if palette else Image.fromarray(tile)
+                else:
+                    layer = _grid_image(np.zeros(COLS * ROWS, dtype=np.uint8), palette)
+                _GRID_LAYERS[key] = layer
+    return layer
+
+
+def _copy_weeks(img: Image.Image, layer: Image.Image, start: int, stop: int) -> None:
+    """
+    Copies the cells of weeks [start, stop) from a grid layer onto the canvas,
+    as run-length slices: whole years at once, partial years as one column slice.
+    """
+    while start < stop:
+        year, week_of_year = divmod(start, ROWS)
+        if week_of_year == 0 and stop - start >= ROWS:
+            years = (stop - start) // ROWS
+            box = (year * CELL_PITCH_X, 0, (year + years) * CELL_PITCH_X, ROWS * CELL_PITCH_Y)
+            start += years * ROWS
+        else:
+            last_week = min(ROWS, week_of_year + stop - start)
+            box = (year * CELL_PITCH_X, week_of_year * CELL_PITCH_Y, (year + 1) * CELL_PITCH_X, last_week * CELL_PITCH_Y)
+            start += last_week - week_of_year
+        img.paste(layer.crop(box), (GRID_BOX[0] + box[0], GRID_BOX[1] + box[1]))
+
+
+def _paint_weeks(img: Image.Image, weeks_passed: int, start: int = 0, stop: int = COLS * ROWS) -> None:
+    """
+    Repaints the cells of weeks [start, stop) as they look after `weeks_passed` weeks.
+    Life stages change on year boundaries, so this is a handful of slices of the
+    pre-built grid layers plus the current week tile.
+    """
+    palette = img.mode == "P"
+    weeks_passed = _clamp_weeks(weeks_passed)
+    stop = min(stop, COLS * ROWS)
+    _copy_weeks(img, _grid_layer("lived", palette), start, min(stop, weeks_passed))
+    _copy_weeks(img, _grid_layer("empty", palette), max(start, weeks_passed + 1), stop)
+    if start <= weeks_passed < stop:
+        year, week_of_year = divmod(weeks_passed, ROWS)
+        img.paste(_grid_layer("current", palette), (GRID_BOX[0] + year * CELL_PITCH_X, GRID_BOX[1] + week_of_year * CELL_PITCH_Y))
+
+
+def _clamp_weeks(weeks_passed: int) -> int:
+    """Lived weeks as the table shows them: none before birth, the whole grid at most."""
+    return max(0, min(weeks_passed, COLS * ROWS))
+
+
+def _paint_grid(img: Image.Image, weeks_passed: int) -> None:
+    """Paints lived weeks and the current week onto a canvas that already holds the empty grid."""
+    _paint_weeks(img, weeks_passed, 0, weeks_passed + 1)
+
+
+def _draw_base_layer(lang_code: str, locales: dict, font_path: str) -> Image.Image:
+    """Draws everything that does not depend on the birthday or the quote."""
     def get_text(key: str, default: str = None) -> str:
-        try:
-            keys = key.split('.')
-            value = locales
-            for k in keys:
-                value = value[k]
-            return value.get(lang_code, value.get('en', default or f"_{key}_"))
-        except (KeyError, AttributeError):
-            return default or f"_{key}_"
-
-    total_weeks = 90 * 52
-    weeks_passed = calculate_weeks_passed(birthday)
-
-    # --- Setup ---
-    cols, rows = 90, 52
-    box_size = 12
-    box_padding_x, box_padding_y = 3, 4 # Horizontal and vertical padding
-    margin = {
-        "top": 170, "bottom": 220, "left": 180, "right": 50
-    }
-    img_width = margin["left"] + cols * (box_size + box_padding_x) - box_padding_x + margin["right"]
-    img_height = margin["top"] + rows * (box_size + box_padding_y) - box_padding_y + margin["bottom"]
-
-    # --- Colors ---
-    colors = {
-        "text": "#333333", "outline": "#cccccc", "arrow": "#000000",
-        "footer": "#aaaaaa",
-        "childhood_adolescence": "#89cff0",  # Light Blue for 0-17
-        "young_adulthood": "#90ee90",       # Light Green for 18-39
-        "middle_age": "#ffd700",           # Gold for 40-64
-        "seniority": "#da70d6",            # Orchid for 65-90
-        "current_week": "#ff4500",
-        "future": "#ffffff"
-    }
+        return _get_text(locales, lang_code, key, default)
 
+    img_width, img_height, margin, colors = IMG_WIDTH, IMG_HEIGHT, MARGIN, COLORS
     img = Image.new("RGB", (img_width, img_height), "white")
     draw = ImageDraw.Draw(img)
-
-    # --- Fonts ---
-    def load_font(size):
-        try: return ImageFont.truetype(font_path, size=size)
-        except (IOError, OSError): return ImageFont.load_default()
-    
-    fonts = {
-        "title": load_font(40), "axis": load_font(30), "label": load_font(22),
-        "legend": load_font(24), "quote": load_font(28), "footer": load_font(20)
-    }
+    fonts = _load_fonts(font_path)
 
     # --- Main Title ---
     title_text = get_text("image_title")
@@ -73,8 +245,8 @@ def generate_life_table_image(
     draw.line([(margin["left"], x_axis_y), (img_width - margin["right"], x_axis_y)], fill=colors["arrow"], width=2)
     draw.polygon([(img_width - margin["right"], x_axis_y - 6), (img_width - margin["right"], x_axis_y + 6), (img_width - margin["right"] + 10, x_axis_y)], fill=colors["arrow"])
     draw.text((margin["left"], x_axis_y - 50), get_text("x_axis_label"), fill=colors["text"], font=fonts["axis"])
-    for i in range(5, cols + 1, 5):
-        x = margin["left"] + i * (box_size + box_padding_x) - (box_size + box_padding_x) / 2
+    for i in range(5, COLS + 1, 5):
+        x = margin["left"] + i * (BOX_SIZE + BOX_PADDING_X) - (BOX_SIZE + BOX_PADDING_X) / 2
         draw.text((x, x_axis_y + 10), str(i), fill=colors["text"], font=fonts["label"], anchor="mt")
 
     # Y-Axis (Week of the Year)
@@ -89,36 +261,12 @@ def generate_life_table_image(
     paste_x = y_axis_x - rotated.width - 50
     paste_y = margin["top"] + (img_height - margin["top"] - margin["bottom"]) // 2 - rotated.height // 2
     img.paste(rotated, (paste_x, paste_y), rotated)
-    for i in range(5, rows + 1, 5):
-        y = margin["top"] + i * (box_size + box_padding_y) - (box_size + box_padding_y) / 2
+    for i in range(5, ROWS + 1, 5):
+        y = margin["top"] + i * (BOX_SIZE + BOX_PADDING_Y) - (BOX_SIZE + BOX_PADDING_Y) / 2
         draw.text((y_axis_x + 15, y), str(i), fill=colors["text"], font=fonts["label"], anchor="lm")
 
-    # --- Grid Drawing ---
-    life_stage_weeks = {
-        "childhood_adolescence": 18 * 52,
-        "young_adulthood": 40 * 52,
-        "middle_age": 65 * 52,
-    }
-    for year in range(cols):
-        for week_of_year in range(rows):
-            x = margin["left"] + year * (box_size + box_padding_x)
-            y = margin["top"] + week_of_year * (box_size + box_padding_y)
-            current_week_index = year * 52 + week_of_year
-
-            fill_color = colors["future"]
-            if current_week_index == weeks_passed:
-                fill_color = colors["current_week"]
-            elif current_week_index < weeks_passed:
-                if current_week_index < life_stage_weeks["childhood_adolescence"]:
-                    fill_color = colors["childhood_adolescence"]
-                elif current_week_index < life_stage_weeks["young_adulthood"]:
-                    fill_color = colors["young_adulthood"]
-                elif current_week_index < life_stage_weeks["middle_age"]:
-                    fill_color = colors["middle_age"]
-                else:
-                    fill_color = colors["seniority"]
-            
-            draw.rectangle([x, y, x + box_size, y + box_size], fill=fill_color, outline=colors["outline"], width=1)
+    # --- Empty Grid ---
+    img.paste(_grid_layer("empty"), GRID_BOX[:2])
 
     # --- Legend ---
     legend_items = {
@@ -142,26 +290,246 @@ def generate_life_table_image(
         draw.text((current_x, legend_y + legend_box_size / 2), label, font=fonts["legend"], fill=colors["text"], anchor="lm")
         current_x += text_width + 30
 
-    # --- Motivational Quote ---
-    # Get the list of quotes for the specific language, fallback to English.
-    lang_quotes = quotes.get(lang_code) or quotes.get("en", ["Your future is a blank canvas. Paint it well."])
-    quote = random.choice(lang_quotes)
-        
-    avg_char_width = fonts["quote"].getbbox("A")[2] or fonts["quote"].size * 0.6
-    max_chars_per_line = int((img_width - margin["left"] - margin["right"]) / avg_char_width)
-    wrapped_quote = textwrap.wrap(quote, width=max_chars_per_line)
-    
-    quote_y = img_height - 85
-    for i, line in enumerate(wrapped_quote):
-        line_bbox = draw.textbbox((0, 0), line, font=fonts["quote"])
-        draw.text(((img_width - line_bbox[2]) / 2, quote_y + i * (fonts["quote"].size + 5)), line, font=fonts["quote"], fill=colors["text"], align="center")
-
     # --- Footer ---
+    # The quote block never reaches the footer, so it is safe to bake it in here.
     footer = "t.me/life_table_time_bot"
     footer_bbox = draw.textbbox((0, 0), footer, font=fonts["footer"])
     draw.text((img_width - footer_bbox[2] - margin["right"], img_height - 30), footer, fill=colors["footer"], font=fonts["footer"])
-    
-    output = io.BytesIO()
-    img.save(output, format="PNG")
-    output.seek(0)
-    return output.getvalue()
+
+    return img
+
+
+def get_base_layer(lang_code: str, locales: dict, font_path: str = DEFAULT_FONT_PATH, palette: bool = False) -> Image.Image:
+    """Returns the cached static canvas for a language, drawing it on first use. Do not mutate it."""
+    key = (lang_code, font_path)
+    base = _BASE_LAYERS.get(key)
+    if base is None:
+        with _LAYERS_LOCK:
+            base = _BASE_LAYERS.get(key)
+            if base is None:
+                base = _draw_base_layer(lang_code, locales, font_path)
+                _BASE_LAYERS[key] = base
+    return _in_mode(("base",) + key, base, palette)
+
+
+def clear_base_layers() -> None:
+    """Drops all cached base canvases, e.g. after the locales have been reloaded."""
+    _BASE_LAYERS.clear()
+    _PALETTE_LAYERS.clear()
+    with _QUOTE_STRIPS_LOCK:
+        _QUOTE_STRIPS.clear()
+
+
+def _lang_quotes(quotes: dict, lang_code: str) -> list:
+    # Get the list of quotes for the specific language, fallback to English.
+    return quotes.get(lang_code) or quotes.get("en", ["Your future is a blank canvas. Paint it well."])
+
+
+def choose_quote(quotes: dict, lang_code: str, mode: str = QUOTE_MODE, day: date = None) -> str:
+    """
+    Picks the quote shown on the image. In "weekly" mode every user of a language
+    gets the same quote for the whole ISO week, otherwise a random one.
+    """
+    lang_quotes = _lang_quotes(quotes, lang_code)
+    if mode != "weekly":
+        return random.choice(lang_quotes)
+    iso_year, iso_week, _ = (day or date.today()).isocalendar()
+    return lang_quotes[(iso_year * 53 + iso_week) % len(lang_quotes)]
+
+
+def render_cache_key(lang_code: str, weeks_passed: int, quote: str, encoder: ImageEncoder = None) -> str:
+    """
+    Content key of a render: the image depends on nothing else than the language,
+    the packed life grid, the quote and the encoder settings.
+    """
+    encoder = encoder or default_encoder
+    payload = f"{RENDER_VERSION}\0{encoder.signature}\0{lang_code}\0{quote}\0".encode("utf-8")
+    return hashlib.sha256(payload + packed_grid(_clamp_weeks(weeks_passed))).hexdigest()[:32]
+
+
+def render_life_table(
+    weeks_passed: int,
+    lang_code: str,
+    locales: dict,
+    quote: str,
+    font_path: str = DEFAULT_FONT_PATH,
+    encoder: ImageEncoder = None
+) -> bytes:
+    """Renders the life table for a number of lived weeks and a given quote."""
+    # Every render path and render_cache_key see the same, in-range week count
+    weeks_passed = _clamp_weeks(weeks_passed)
+    encoder = encoder or default_encoder
+    img = get_base_layer(lang_code, locales, font_path, encoder.palette).copy()
+
+    # --- Grid Drawing ---
+    _paint_grid(img, weeks_passed)
+
+    # --- Motivational Quote ---
+    _draw_quote(img, quote, font_path, get_base_layer(lang_code, locales, font_path))
+
+    return encoder.encode(img)
+
+
+# Finished quote areas by (base layer, quote, font, palette), so a quote is drawn
+# once per language and every further render only pastes it.
+QUOTE_STRIP_CACHE_SIZE = 128
+_QUOTE_STRIPS = OrderedDict()
+_QUOTE_STRIPS_LOCK = threading.Lock()
+
+
+@lru_cache(maxsize=512)
+def _quote_layout(quote: str, font_path: str) -> Tuple[Tuple[float, int, str], ...]:
+    """Wraps a quote and returns the (x, y, line) of every line within the quote area."""
+    quote_font = get_font(font_path, FONT_SIZES["quote"])
+    draw = ImageDraw.Draw(Image.new("RGB", (1, 1)))
+    avg_char_width = quote_font.getbbox("A")[2] or quote_font.size * 0.6
+    max_chars_per_line = int((IMG_WIDTH - MARGIN["left"] - MARGIN["right"]) / avg_char_width)
+
+    quote_y = IMG_HEIGHT - 85 - QUOTE_BOX[1]
+    layout = []
+    for i, line in enumerate(textwrap.wrap(quote, width=max_chars_per_line)):
+        line_bbox = draw.textbbox((0, 0), line, font=quote_font)
+        layout.append(((IMG_WIDTH - line_bbox[2]) / 2, quote_y + i * (quote_font.size + 5), line))
+    return tuple(layout)
+
+
+def _quote_strip(quote: str, font_path: str, base: Image.Image, palette: bool) -> Image.Image:
+    """
+    Returns the quote area of `base` with the quote drawn in, in "P" mode for
+    palette canvases. The area is cut from the base, so pasting it also restores it.
+    """
+    key = (id(base), quote, font_path, palette)
+    with _QUOTE_STRIPS_LOCK:
+        entry = _QUOTE_STRIPS.get(key)
+        if entry is not None and entry[0] is base:
+            _QUOTE_STRIPS.move_to_end(key)
+            return entry[1]
+
+    strip = base.crop(QUOTE_BOX)
+    draw = ImageDraw.Draw(strip)
+    quote_font = get_font(font_path, FONT_SIZES["quote"])
+    for x, y, line in _quote_layout(quote, font_path):
+        draw.text((x, y), line, font=quote_font, fill=COLORS["text"], align="center")
+    if palette:
+        strip = PALETTE.convert(strip)
+
+    with _QUOTE_STRIPS_LOCK:
+        # The base is kept alongside, so its id cannot be reused by another canvas.
+        _QUOTE_STRIPS[key] = (base, strip)
+        while len(_QUOTE_STRIPS) > QUOTE_STRIP_CACHE_SIZE:
+            _QUOTE_STRIPS.popitem(last=False)
+    return strip
+
+
+def _draw_quote(img: Image.Image, quote: str, font_path: str, base: Image.Image) -> None:
+    """Pastes the quote area, drawn from the base layer's one, onto the canvas."""
+    img.paste(_quote_strip(quote, font_path, base, img.mode == "P"), QUOTE_BOX[:2])
+
+
+class IncrementalRenderer:
+    """
+    Keeps the last rendered canvas of each language and produces the next image
+    by patching it instead of starting from the base layer: only the cells the
+    LifeGrid diff reports as changed are repainted, and the quote
+    area only when the quote changed. From one Sunday to the next that is two
+    cells, and renders of neighbouring birthdays in a batch are just as cheap.
+
+    Canvases are keyed by language rather than by user, because the image only
+    depends on (language, weeks_passed, quote). Not thread-safe: use one per
+    process or thread. `last_timings` holds the (paint, encode) seconds of the last image.
+    """
+
+    def __init__(self, locales: dict, font_path: str = DEFAULT_FONT_PATH, encoder: ImageEncoder = None):
+        self.locales = locales
+        self.font_path = font_path
+        self.encoder = encoder or default_encoder
+        self._frames = {}
+        self.last_timings = (0.0, 0.0)
+
+    def render(self, weeks_passed: int, lang_code: str, quote: str) -> bytes:
+        """Returns exactly the bytes render_life_table would for the same arguments."""
+        started = time.perf_counter()
+        weeks_passed = _clamp_weeks(weeks_passed)
+        grid = LifeGrid.from_weeks(weeks_passed)
+        base = get_base_layer(lang_code, self.locales, self.font_path)
+        frame = self._frames.get(lang_code)
+        if frame is None:
+            img = get_base_layer(lang_code, self.locales, self.font_path, self.encoder.palette).copy()
+            _paint_grid(img, weeks_passed)
+            _draw_quote(img, quote, self.font_path, base)
+            self._frames[lang_code] = frame = [img, grid, quote]
+        else:
+            img, previous_grid, previous_quote = frame
+            changed = grid.diff(previous_grid)
+            if changed.size:
+                _paint_weeks(img, weeks_passed, int(changed[0]), int(changed[-1]) + 1)
+            if quote != previous_quote:
+                _draw_quote(img, quote, self.font_path, base)
+            frame[1:] = [grid, quote]
+        painted = time.perf_counter()
+        image_bytes = self.encoder.encode(img)
+        self.last_timings = (painted - started, time.perf_counter() - painted)
+        return image_bytes
+
+
+class RenderSpec(NamedTuple):
+    """One requested image. `tag` is passed through untouched, e.g. the recipient."""
+    lang_code: str
+    weeks_passed: int
+    quote: str
+    tag: Any = None
+
+
+def group_render_specs(specs: Iterable[RenderSpec], encoder: ImageEncoder = None) -> Dict[str, List[RenderSpec]]:
+    """
+    Groups specs by content key. Groups are ordered by (language, weeks_passed),
+    so consecutive distinct images differ in few cells and patch cheaply.
+    """
+    groups = {}
+    for spec in sorted(specs, key=lambda spec: (spec.lang_code, spec.weeks_passed)):
+        key = render_cache_key(spec.lang_code, spec.weeks_passed, spec.quote, encoder)
+        groups.setdefault(key, []).append(spec)
+    return groups
+
+
+def render_many(
+    specs: Iterable[RenderSpec],
+    locales: dict,
+    font_path: str = DEFAULT_FONT_PATH,
+    encoder: ImageEncoder = None
+) -> Iterator[Tuple[str, List[RenderSpec], bytes]]:
+    """
+    Renders each distinct image among `specs` once and yields
+    (content_key, specs_sharing_it, image_bytes) as soon as each one is ready.
+    Work is proportional to the number of distinct images, not to the number of specs.
+    """
+    renderer = IncrementalRenderer(locales, font_path, encoder)
+    for key, group in group_render_specs(specs, encoder).items():
+        image_bytes = render_cache.get(key)
+        if image_bytes is None:
+            first = group[0]
+            image_bytes = renderer.render(first.weeks_passed, first.lang_code, first.quote)
+            render_cache.put(key, image_bytes)
+        yield key, group, image_bytes
+
+
+def generate_life_table_image(
+    birthday: datetime,
+    lang_code: str,
+    locales: dict,
+    quotes: dict,
+    font_path: str = DEFAULT_FONT_PATH
+) -> bytes:
+    """Renders the life table for a birthday with a random quote, bypassing the render cache."""
+    quote = random.choice(_lang_quotes(quotes, lang_code))
+    return render_life_table(calculate_weeks_passed(birthday), lang_code, locales, quote, font_path)
+
+
+def life_table_cache_key(birthday: datetime, lang_code: str, quotes: dict, quote: str = None) -> str:
+    """
+    Content key of the image RenderService.render returns for these arguments.
+    Pass the `quote` the image is rendered with when it is chosen at random.
+    """
+    if quote is None:
+        quote = choose_quote(quotes, lang_code)
+    return render_cache_key(lang_code, calculate_weeks_passed(birthday), quote)
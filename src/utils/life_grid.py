@@ -0,0 +1,117 @@
+import base64
+import struct
+from functools import lru_cache
+from typing import Optional
+
+import numpy as np
+
+# One column per year, one row per week of the year.
+COLS, ROWS = 90, 52
+CELLS = COLS * ROWS
+
+LIFE_STAGE_WEEKS = {
+    "childhood_adolescence": 18 * 52,
+    "young_adulthood": 40 * 52,
+    "middle_age": 65 * 52,
+}
+
+# Cell states, in renderer tile order. A cell's state is its index in this tuple.
+CELL_STATES = (
+    "future", "childhood_adolescence", "young_adulthood", "middle_age", "seniority", "current_week"
+)
+FUTURE = CELL_STATES.index("future")
+CURRENT_WEEK = CELL_STATES.index("current_week")
+
+# Life stage every cell has once it has been lived; it only depends on the cell's index.
+_STAGES = np.searchsorted(list(LIFE_STAGE_WEEKS.values()), np.arange(CELLS), side="right").astype(np.uint8) + 1
+_STAGES.setflags(write=False)
+
+# Serialised form: version, cols, rows, current week (NO_CURRENT if none), then the lived bitmap.
+FORMAT_VERSION = 1
+_HEADER = struct.Struct(">BBBH")
+NO_CURRENT = 0xFFFF
+PACKED_SIZE = _HEADER.size + (CELLS + 7) // 8
+
+
+class LifeGrid:
+    """
+    The state of every week cell of a life table, indexed by week (year * ROWS + week
+    of the year). Stored as a bitmap of lived weeks plus the current week: a lived
+    cell's colour follows from its index, so that is all a renderer needs.
+    Packs into PACKED_SIZE (590) bytes.
+    """
+
+    __slots__ = ("lived", "current")
+
+    def __init__(self, lived: np.ndarray, current: Optional[int] = None):
+        if lived.shape != (CELLS,):
+            raise ValueError(f"Expected {CELLS} cells, got {lived.shape}")
+        if current is not None and not 0 <= current < CELLS:
+            raise ValueError(f"Current week {current} is outside the grid")
+        self.lived = lived.astype(bool, copy=False)
+        self.current = current
+
+    @classmethod
+    def from_weeks(cls, weeks_passed: int) -> "LifeGrid":
+        """Grid after `weeks_passed` weeks: earlier weeks lived, that week current."""
+        weeks_passed = max(0, min(weeks_passed, CELLS))
+        return cls(np.arange(CELLS) < weeks_passed, weeks_passed if weeks_passed < CELLS else None)
+
+    @property
+    def weeks_passed(self) -> int:
+        return int(self.lived.sum())
+
+    @property
+    def states(self) -> np.ndarray:
+        """Returns the state (an index into CELL_STATES) of every cell as a uint8 array."""
+        states = np.where(self.lived, _STAGES, FUTURE).astype(np.uint8)
+        if self.current is not None:
+            states[self.current] = CURRENT_WEEK
+        return states
+
+    def diff(self, other: "LifeGrid") -> np.ndarray:
+        """Returns the sorted indices of the cells whose state differs from `other`."""
+        return np.flatnonzero(self.states != other.states)
+
+    def pack(self) -> bytes:
+        current = NO_CURRENT if self.current is None else self.current
+        return _HEADER.pack(FORMAT_VERSION, COLS, ROWS, current) + np.packbits(self.lived).tobytes()
+
+    @classmethod
+    def unpack(cls, data: bytes) -> "LifeGrid":
+        if len(data) != PACKED_SIZE:
+            raise ValueError(f"Expected {PACKED_SIZE} bytes, got {len(data)}")
+        version, cols, rows, current = _HEADER.unpack_from(data)
+        if (version, cols, rows) != (FORMAT_VERSION, COLS, ROWS):
+            raise ValueError(f"Unsupported grid format {version} ({cols}x{rows})")
+        lived = np.unpackbits(np.frombuffer(data, dtype=np.uint8, offset=_HEADER.size), count=CELLS)
+        return cls(lived, None if current == NO_CURRENT else current)
+
+    def to_dict(self) -> dict:
+        """JSON-friendly form for client-side renderers; `lived` is the base64 bitmap, most significant bit first."""
+        return {
+            "version": FORMAT_VERSION,
+            "cols": COLS,
+            "rows": ROWS,
+            "stage_weeks": list(LIFE_STAGE_WEEKS.values()),
+            "states": list(CELL_STATES),
+            "current": self.current,
+            "lived": base64.b64encode(np.packbits(self.lived).tobytes()).decode("ascii"),
+        }
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, LifeGrid) and self.pack() == other.pack()
+
+    def __hash__(self) -> int:
+        return hash(self.pack())
+
+
+def cell_states(weeks_passed: int) -> np.ndarray:
+    """Returns the state (an index into CELL_STATES) of every week cell, ordered by week index."""
+    return LifeGrid.from_weeks(weeks_passed).states
+
+
+@lru_cache(maxsize=CELLS + 1)
+def packed_grid(weeks_passed: int) -> bytes:
+    """LifeGrid.from_weeks(weeks_passed).pack(), memoised: there are only CELLS + 1 such grids."""
+    return LifeGrid.from_weeks(weeks_passed).pack()
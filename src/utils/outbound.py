@@ -0,0 +1,205 @@
+import asyncio
+import logging
+import time
+from collections import Counter, deque
+from typing import Any, Callable, Coroutine, Deque, Dict, List, Optional, Union
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from src.config import OUTBOUND_RATE, OUTBOUND_WEEKLY_SHARE, OUTBOUND_BROADCAST_SHARE
+from .rate_limit import TokenBucket, retry_after_seconds
+from .run_metrics import BUCKETS, Histogram
+
+logger = logging.getLogger(__name__)
+
+# Lanes, passed as `rate_limit_args` of a bot call (see lane_args). Calls without one are interactive.
+INTERACTIVE_LANE = "interactive"
+WEEKLY_LANE = "weekly"
+BROADCAST_LANE = "broadcast"
+
+# Number of recent sends the lanes' shares are measured over
+SHARE_WINDOW = 200
+
+
+class Lane:
+    """Waiting requests and counters of one priority lane."""
+
+    def __init__(self, name: str, min_share: float, retries: int):
+        self.name = name
+        self.min_share = min_share
+        self.retries = retries
+        self.waiters: Deque[asyncio.Future] = deque()
+        self.requests = 0
+        self.errors = 0
+        self.retry_afters = 0
+        self.wait = Histogram()
+
+    def pending(self) -> bool:
+        # Waiters whose caller was cancelled are dropped here
+        while self.waiters and self.waiters[0].done():
+            self.waiters.popleft()
+        return bool(self.waiters)
+
+
+class OutboundScheduler(BaseRateLimiter[str]):
+    """
+    Rate limiter of the Application's bot: every message to a chat waits for a
+    token of one global bucket of `rate` per second, handed out by lane priority
+    (interactive, then weekly, then broadcast). A backlogged lane whose share of
+    the last SHARE_WINDOW sends is below its min_share is served first, so bulk
+    sends slow down for menu replies but are never starved. Calls that are not
+    messages to a chat (callback answers, commands setup...) are not limited.
+
+    A RetryAfter pauses the whole bucket. Interactive calls are retried once,
+    the weekly job and broadcasts retry through their own SendLimiter.
+    """
+
+    def __init__(self, rate: float, weekly_share: float = 0.25, broadcast_share: float = 0.1):
+        self.bucket = TokenBucket(rate)
+        self.lanes = [
+            Lane(INTERACTIVE_LANE, 0.0, retries=1),
+            Lane(WEEKLY_LANE, weekly_share, retries=0),
+            Lane(BROADCAST_LANE, broadcast_share, retries=0),
+        ]
+        self._by_name = {lane.name: lane for lane in self.lanes}
+        self._recent: Deque[str] = deque(maxlen=SHARE_WINDOW)
+        self._recent_counts = Counter()
+        self._sent = Counter()
+        self._dispatcher: Optional[asyncio.Task] = None
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        if self._dispatcher:
+            self._dispatcher.cancel()
+            self._dispatcher = None
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, Union[bool, Dict[str, Any], List[Dict[str, Any]]]]],
+        args: Any,
+        kwargs: Dict[str, Any],
+        endpoint: str,
+        data: Dict[str, Any],
+        rate_limit_args: Optional[str],
+    ) -> Union[bool, Dict[str, Any], List[Dict[str, Any]]]:
+        if "chat_id" not in data:
+            return await callback(*args, **kwargs)
+        lane = self._by_name.get(rate_limit_args or INTERACTIVE_LANE)
+        if lane is None:
+            raise ValueError(f"Unknown outbound lane: {rate_limit_args}")
+
+        lane.requests += 1
+        for attempt in range(lane.retries + 1):
+            await self._acquire(lane)
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                lane.retry_afters += 1
+                seconds = retry_after_seconds(e)
+                logger.warning(f"Flood control hit on the {lane.name} lane, pausing all sends for {seconds}s")
+                self.bucket.pause(seconds)
+                if attempt == lane.retries:
+                    lane.errors += 1
+                    raise
+            except Exception:
+                lane.errors += 1
+                raise
+
+    async def _acquire(self, lane: Lane) -> None:
+        started = time.perf_counter()
+        future = asyncio.get_running_loop().create_future()
+        lane.waiters.append(future)
+        if not self._dispatcher or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        await future
+        lane.wait.observe(time.perf_counter() - started)
+
+    async def _dispatch(self) -> None:
+        """Hands out the bucket's tokens to the waiting requests until none are left."""
+        while any(lane.pending() for lane in self.lanes):
+            await self.bucket.acquire()
+            lane = self._next_lane()
+            if lane is None:
+                continue
+            lane.waiters.popleft().set_result(None)
+            self._record_send(lane.name)
+
+    def _next_lane(self) -> Optional[Lane]:
+        backlogged = [lane for lane in self.lanes if lane.pending()]
+        if not backlogged:
+            return None
+        starved = [lane for lane in backlogged if self.share(lane.name) < lane.min_share]
+        if starved:
+            return max(starved, key=lambda lane: lane.min_share - self.share(lane.name))
+        return backlogged[0]
+
+    def _record_send(self, name: str) -> None:
+        if len(self._recent) == self._recent.maxlen:
+            self._recent_counts[self._recent[0]] -= 1
+        self._recent.append(name)
+        self._recent_counts[name] += 1
+        self._sent[name] += 1
+
+    def share(self, name: str) -> float:
+        """Fraction of the last SHARE_WINDOW sends that went to lane `name`."""
+        return self._recent_counts[name] / len(self._recent) if self._recent else 0.0
+
+    def stats(self) -> Dict[str, dict]:
+        return {
+            lane.name: {
+                "requests": lane.requests,
+                "sent": self._sent[lane.name],
+                "errors": lane.errors,
+                "retry_afters": lane.retry_afters,
+                "waiting": len(lane.waiters),
+                "share": round(self.share(lane.name), 3),
+                "min_share": lane.min_share,
+                "wait": lane.wait.to_dict(),
+            }
+            for lane in self.lanes
+        }
+
+    def to_prometheus(self) -> str:
+        """Renders the lane counters in the Prometheus text exposition format."""
+        stats = self.stats()
+        lines = []
+        for metric, kind, help_text in (
+            ("requests", "counter", "Bot calls that went through the lane."),
+            ("sent", "counter", "Send tokens handed out to the lane."),
+            ("errors", "counter", "Bot calls of the lane that failed."),
+            ("retry_afters", "counter", "Flood control answers on the lane."),
+            ("waiting", "gauge", "Bot calls waiting in the lane."),
+            ("share", "gauge", f"Fraction of the last {SHARE_WINDOW} sends that went to the lane."),
+        ):
+            series = f"outbound_{metric}_total" if kind == "counter" else f"outbound_{metric}"
+            lines += [f"# HELP {series} {help_text}", f"# TYPE {series} {kind}"]
+            lines += [f'{series}{{lane="{name}"}} {lane[metric]}' for name, lane in stats.items()]
+        lines += [
+            "# HELP outbound_wait_seconds Time bot calls waited for a send token, by lane.",
+            "# TYPE outbound_wait_seconds histogram",
+        ]
+        for name, lane in stats.items():
+            cumulative = 0
+            for bound, count in zip(BUCKETS + (float("inf"),), lane["wait"]["buckets"]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'outbound_wait_seconds_bucket{{lane="{name}",le="{le}"}} {cumulative}')
+            lines.append(f'outbound_wait_seconds_sum{{lane="{name}"}} {lane["wait"]["sum"]}')
+            lines.append(f'outbound_wait_seconds_count{{lane="{name}"}} {lane["wait"]["count"]}')
+        return "\n".join(lines) + "\n"
+
+
+def lane_args(bot, lane: str) -> dict:
+    """
+    Keyword arguments that put a bot call on `lane`. Empty for bots without an
+    OutboundScheduler (plain Bot, the dry-run FakeBot), which reject rate_limit_args.
+    """
+    if isinstance(getattr(bot, "rate_limiter", None), OutboundScheduler):
+        return {"rate_limit_args": lane}
+    return {}
+
+
+outbound_scheduler = OutboundScheduler(OUTBOUND_RATE, OUTBOUND_WEEKLY_SHARE, OUTBOUND_BROADCAST_SHARE)
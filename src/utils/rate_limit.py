@@ -0,0 +1,145 @@
+import asyncio
+import logging
+import time
+from datetime import timedelta
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+def retry_after_seconds(error: RetryAfter) -> float:
+    """RetryAfter.retry_after is an int or, with newer settings, a timedelta."""
+    retry_after = error.retry_after
+    if isinstance(retry_after, timedelta):
+        return retry_after.total_seconds()
+    return float(retry_after)
+
+
+# BadRequest messages that mean the chat can never be sent to again
+PERMANENT_ERROR_MESSAGES = (
+    "chat not found",
+    "user not found",
+    "user is deactivated",
+    "bot was blocked",
+    "peer_id_invalid",
+    "bot can't initiate conversation",
+)
+
+
+def is_permanent_send_error(error: Exception) -> bool:
+    """
+    True for failures that will not go away by retrying: the user blocked the bot,
+    deleted their account or the chat does not exist. Anything else (flood control,
+    timeouts, network errors, other bad requests) is treated as transient.
+    """
+    if isinstance(error, Forbidden):
+        return True
+    if isinstance(error, BadRequest):
+        message = error.message.lower()
+        return any(permanent in message for permanent in PERMANENT_ERROR_MESSAGES)
+    return False
+
+
+class TokenBucket:
+    """
+    Async token bucket: refills `rate` tokens per second up to `capacity`, and
+    every acquire() takes one token, waiting for it if needed. pause() stops
+    handing out tokens for a while, e.g. when Telegram answers with RetryAfter.
+    Not thread-safe, use it from one event loop.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self) -> None:
+        while True:
+            now = time.monotonic()
+            if now < self._paused_until:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+            self._refill(now)
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def pause(self, seconds: float) -> None:
+        """Hands out no tokens for `seconds`; the bucket restarts empty, so sending resumes gradually."""
+        now = time.monotonic()
+        self._paused_until = max(self._paused_until, now + seconds)
+        self._tokens = 0
+        self._updated = self._paused_until
+
+    @property
+    def paused(self) -> bool:
+        return time.monotonic() < self._paused_until
+
+
+class SendLimiter:
+    """
+    Keeps outgoing messages within Telegram's limits: a global token bucket
+    (about 30 messages per second for bulk sends) plus a minimum interval
+    between two messages to the same chat (about one per second).
+    """
+
+    def __init__(self, rate: float, chat_interval: float = 1.0, max_retries: int = 5, network_retries: int = 2):
+        self.bucket = TokenBucket(rate)
+        self.chat_interval = chat_interval
+        self.max_retries = max_retries
+        self.network_retries = network_retries
+        self._next_chat_send: Dict[int, float] = {}
+        self.retry_afters = 0
+        self.network_errors = 0
+
+    async def acquire(self, chat_id: int) -> None:
+        now = time.monotonic()
+        next_send = self._next_chat_send.get(chat_id, 0.0)
+        self._next_chat_send[chat_id] = max(now, next_send) + self.chat_interval
+        if next_send > now:
+            await asyncio.sleep(next_send - now)
+        await self.bucket.acquire()
+        if len(self._next_chat_send) > 10000:
+            self._forget_idle_chats()
+
+    def _forget_idle_chats(self) -> None:
+        now = time.monotonic()
+        self._next_chat_send = {chat: t for chat, t in self._next_chat_send.items() if t > now}
+
+    async def call(self, chat_id: int, func: Callable[..., Awaitable[T]], /, *args, **kwargs) -> T:
+        """
+        Calls `func` once the limits allow a message to `chat_id`. A RetryAfter pauses
+        the whole bucket for the requested time and the call is retried, up to `max_retries` times.
+        Timeouts and network errors are retried `network_retries` times, with a growing delay.
+        """
+        network_attempts = 0
+        for attempt in range(self.max_retries + 1):
+            await self.acquire(chat_id)
+            try:
+                return await func(*args, **kwargs)
+            except RetryAfter as e:
+                if attempt == self.max_retries:
+                    raise
+                seconds = retry_after_seconds(e)
+                self.retry_afters += 1
+                logger.warning(f"Flood control hit, pausing sends for {seconds}s")
+                self.bucket.pause(seconds)
+            except NetworkError as e:
+                # BadRequest is a NetworkError too, but retrying it would not help
+                if isinstance(e, BadRequest) or network_attempts >= self.network_retries or attempt == self.max_retries:
+                    raise
+                network_attempts += 1
+                self.network_errors += 1
+                logger.warning(f"Network error sending to {chat_id}, retrying: {e}")
+                await asyncio.sleep(network_attempts)
@@ -0,0 +1,169 @@
+import os
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any
+
+from src.config import RENDER_CACHE_MAX_BYTES, RENDER_CACHE_DIR, RENDER_CACHE_DISK_MAX_BYTES
+
+logger = logging.getLogger(__name__)
+
+# A pruned disk tier is brought down to this fraction of its budget, so the
+# writes that follow do not each trigger another directory scan.
+DISK_PRUNE_TARGET = 0.9
+
+
+class RenderCache:
+    """
+    Content-addressed cache for rendered life-table images.
+    Entries live in an in-memory LRU bounded by total bytes, with an optional
+    on-disk tier that survives restarts and is shared between processes. Disk hits
+    touch their file, so the disk tier is pruned least recently used first.
+    """
+
+    def __init__(self, max_bytes: int, disk_dir: Optional[str] = None, disk_max_bytes: int = 0):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        # Running byte total of the disk tier, from one scan plus this process's writes;
+        # the directory is only scanned again when it goes over the budget.
+        self._disk_size: Optional[int] = None
+        self._disk_lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Returns the cached image for a key, or None on a miss."""
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return data
+
+        data = self._read_disk(key)
+        with self._lock:
+            if data is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._store(key, data)
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        """Stores an image in memory and, if configured, on disk."""
+        with self._lock:
+            self._store(key, data)
+        self._write_disk(key, data)
+
+    def _store(self, key: str, data: bytes) -> None:
+        if len(data) > self.max_bytes:
+            return
+        if key in self._entries:
+            self._size -= len(self._entries.pop(key))
+        self._entries[key] = data
+        self._size += len(data)
+        while self._size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= len(evicted)
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.img")
+
+    def _read_disk(self, key: str) -> Optional[bytes]:
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logger.error(f"Error reading render cache entry {key}: {e}")
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass  # pruned by another process meanwhile
+        return data
+
+    def _write_disk(self, key: str, data: bytes) -> None:
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            replaced = os.path.getsize(path) if os.path.exists(path) else 0
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.error(f"Error writing render cache entry {key}: {e}")
+            return
+        if not self.disk_max_bytes:
+            return
+        with self._disk_lock:
+            if self._disk_size is None:
+                self._prune_disk(self.disk_max_bytes)
+            else:
+                self._disk_size += len(data) - replaced
+            if self._disk_size > self.disk_max_bytes:
+                self._prune_disk(int(self.disk_max_bytes * DISK_PRUNE_TARGET))
+
+    def _prune_disk(self, target: int) -> None:
+        """
+        Scans the disk tier, deletes the least recently used files until it holds at
+        most `target` bytes and resets the running total. Call with _disk_lock held.
+        """
+        try:
+            entries = []
+            with os.scandir(self.disk_dir) as it:
+                for entry in it:
+                    if entry.name.endswith(".img"):
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+            self._disk_size = total
+        except OSError as e:
+            logger.error(f"Error pruning render cache directory: {e}")
+            self._disk_size = 0
+
+    def clear(self) -> None:
+        """Empties the in-memory tier and resets the counters. The disk tier is left alone."""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+            self.hits = self.disk_hits = self.misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns hit/miss counters and the current memory footprint."""
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                'entries': len(self._entries),
+                'bytes': self._size,
+                'max_bytes': self.max_bytes,
+            }
+
+
+# Shared by the handlers and the weekly job.
+render_cache = RenderCache(RENDER_CACHE_MAX_BYTES, RENDER_CACHE_DIR, RENDER_CACHE_DISK_MAX_BYTES)
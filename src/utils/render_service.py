@@ -0,0 +1,225 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from typing import AsyncIterator, Callable, Iterable, List, Optional, Tuple
+
+from src.config import RENDER_WORKERS, RENDER_QUEUE_SIZE, RENDER_BATCH_SIZE
+from . import localization
+from . import image_generator
+from .helpers import calculate_weeks_passed
+from .render_cache import render_cache
+
+logger = logging.getLogger(__name__)
+
+
+# --- Worker process side ---
+
+# Each worker patches its previous canvas instead of redrawing from the base layer.
+_incremental_renderer = None
+
+
+def _init_worker(locales: dict, font_path: str) -> None:
+    """
+    Runs once in every worker: installs the locales, loads the fonts and pre-draws
+    each language's base layer, also in the palette mode renders are encoded in.
+    """
+    global _incremental_renderer
+    localization.LOCALES = locales
+    image_generator.preload_fonts(font_path)
+    palette = image_generator.default_encoder.palette
+    for lang_code in locales.get("languages", {"en": "English"}):
+        image_generator.get_base_layer(lang_code, locales, font_path, palette)
+    _incremental_renderer = image_generator.IncrementalRenderer(locales, font_path)
+
+
+def _render_in_worker(weeks_passed: int, lang_code: str, quote: str, font_path: str) -> Tuple[bytes, float]:
+    """Returns the image and the seconds spent rendering it, measured in the worker."""
+    started = time.perf_counter()
+    image_bytes = _incremental_renderer.render(weeks_passed, lang_code, quote)
+    return image_bytes, time.perf_counter() - started
+
+
+def _render_in_thread(weeks_passed: int, lang_code: str, locales: dict, quote: str, font_path: str) -> Tuple[bytes, float]:
+    started = time.perf_counter()
+    image_bytes = image_generator.render_life_table(weeks_passed, lang_code, locales, quote, font_path)
+    return image_bytes, time.perf_counter() - started
+
+
+def _render_batch(renderer, items: List[Tuple[int, str, str]]) -> List[Tuple[bytes, float, float]]:
+    """Renders `items` and returns (image_bytes, paint_seconds, encode_seconds) for each."""
+    results = []
+    for item in items:
+        image_bytes = renderer.render(*item)
+        results.append((image_bytes, *renderer.last_timings))
+    return results
+
+
+def _render_batch_in_worker(items: List[Tuple[int, str, str]], font_path: str) -> List[Tuple[bytes, float, float]]:
+    return _render_batch(_incremental_renderer, items)
+
+
+def _render_batch_in_thread(items: List[Tuple[int, str, str]], locales: dict, font_path: str) -> List[Tuple[bytes, float, float]]:
+    return _render_batch(image_generator.IncrementalRenderer(locales, font_path), items)
+
+
+# --- Event loop side ---
+
+class RenderService:
+    """
+    Renders life tables off the event loop. Renders run in a pool of worker
+    processes (or a thread when `workers` is 0), at most `queue_size` are
+    queued at once and further callers wait for a free slot.
+    """
+
+    def __init__(self, workers: int, queue_size: int, batch_size: int = 16, font_path: str = image_generator.DEFAULT_FONT_PATH):
+        self.workers = workers
+        self.queue_size = max(1, queue_size)
+        self.batch_size = max(1, batch_size)
+        self.font_path = font_path
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._loop = None
+        self._slots = None
+        self._pending = {}
+        # Images rendered and seconds spent rendering them, measured in the workers (without
+        # the wait for a free one) and summed over them
+        self.rendered = 0
+        self.render_seconds = 0.0
+
+    def start(self) -> None:
+        """Starts the worker pool. Called lazily by render(), the locales must be loaded by then."""
+        if self._executor is None and self.workers > 0:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_init_worker,
+                initargs=(localization.LOCALES, self.font_path)
+            )
+            logger.info(f"Render pool started with {self.workers} worker(s)")
+
+    def shutdown(self, wait: bool = False) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
+
+    async def _run_in_pool(self, func: Callable, *args):
+        """
+        Runs `func` in the worker pool. A worker that dies (killed for memory, a crash
+        in Pillow) breaks the whole pool, so it is replaced and the call retried once.
+        """
+        for attempt in range(2):
+            self.start()
+            executor = self._executor
+            try:
+                return await self._loop.run_in_executor(executor, func, *args)
+            except BrokenProcessPool:
+                # Concurrent calls all see the broken pool, only the first one replaces it
+                if self._executor is executor:
+                    logger.error("A render worker died, restarting the render pool")
+                    self.shutdown()
+                if attempt:
+                    raise
+
+    def _bind_loop(self) -> None:
+        # Webhook mode runs every update in a fresh event loop, asyncio primitives
+        # cannot be shared between loops.
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._slots = asyncio.Semaphore(self.queue_size)
+            self._pending = {}
+
+    async def render(self, birthday: datetime, lang_code: str, quote: str = None) -> bytes:
+        """
+        Returns the life table for a birthday through the shared render cache, without
+        blocking the event loop. Users of the same language born in the same week share
+        one render. `quote` is the one the caller keyed the image with, otherwise it is chosen here.
+        """
+        weeks_passed = calculate_weeks_passed(birthday)
+        if quote is None:
+            quote = image_generator.choose_quote(localization.QUOTES, lang_code)
+        key = image_generator.render_cache_key(lang_code, weeks_passed, quote)
+        image_bytes = render_cache.get(key)
+        if image_bytes is not None:
+            return image_bytes
+
+        self._bind_loop()
+        # Concurrent requests for the same image wait for a single render.
+        pending = self._pending.get(key)
+        if pending is None:
+            pending = asyncio.ensure_future(self._render(key, weeks_passed, lang_code, quote))
+            self._pending[key] = pending
+            pending.add_done_callback(lambda _: self._pending.pop(key, None))
+        return await asyncio.shield(pending)
+
+    async def _render(self, key: str, weeks_passed: int, lang_code: str, quote: str) -> bytes:
+        async with self._slots:
+            # Render time is measured where the render runs, without the wait for a free worker
+            if self.workers > 0:
+                image_bytes, seconds = await self._run_in_pool(
+                    _render_in_worker, weeks_passed, lang_code, quote, self.font_path
+                )
+            else:
+                image_bytes, seconds = await asyncio.to_thread(
+                    _render_in_thread, weeks_passed, lang_code, localization.LOCALES, quote, self.font_path
+                )
+            self.rendered += 1
+            self.render_seconds += seconds
+        render_cache.put(key, image_bytes)
+        return image_bytes
+
+    async def render_many(
+        self,
+        specs: Iterable[image_generator.RenderSpec],
+        on_timing: Callable[[float, float], None] = None
+    ) -> AsyncIterator[Tuple[str, List[image_generator.RenderSpec], bytes]]:
+        """
+        Async counterpart of image_generator.render_many: each distinct image is
+        rendered once, in batches of neighbouring images spread over the pool,
+        and (content_key, specs_sharing_it, image_bytes) is yielded as batches finish.
+        `on_timing` is called with the (paint, encode) seconds of every rendered image.
+        """
+        missing = []
+        for key, group in image_generator.group_render_specs(specs).items():
+            image_bytes = render_cache.get(key)
+            if image_bytes is not None:
+                yield key, group, image_bytes
+            else:
+                missing.append((key, group))
+        if not missing:
+            return
+
+        self._bind_loop()
+        batches = [missing[i:i + self.batch_size] for i in range(0, len(missing), self.batch_size)]
+        tasks = [asyncio.ensure_future(self._render_batch(batch, on_timing)) for batch in batches]
+        try:
+            for next_batch in asyncio.as_completed(tasks):
+                for result in await next_batch:
+                    yield result
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _render_batch(self, batch: list, on_timing: Callable[[float, float], None] = None) -> list:
+        items = [(group[0].weeks_passed, group[0].lang_code, group[0].quote) for _, group in batch]
+        async with self._slots:
+            if self.workers > 0:
+                images = await self._run_in_pool(_render_batch_in_worker, items, self.font_path)
+            else:
+                images = await asyncio.to_thread(
+                    _render_batch_in_thread, items, localization.LOCALES, self.font_path
+                )
+            self.rendered += len(images)
+            self.render_seconds += sum(paint_seconds + encode_seconds for _, paint_seconds, encode_seconds in images)
+        results = []
+        for (key, group), (image_bytes, paint_seconds, encode_seconds) in zip(batch, images):
+            render_cache.put(key, image_bytes)
+            if on_timing:
+                on_timing(paint_seconds, encode_seconds)
+            results.append((key, group, image_bytes))
+        return results
+
+
+# Shared by the handlers and the weekly job.
+render_service = RenderService(RENDER_WORKERS, RENDER_QUEUE_SIZE, RENDER_BATCH_SIZE)
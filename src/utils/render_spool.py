@@ -0,0 +1,90 @@
+import os
+import json
+import shutil
+import logging
+from datetime import date
+from typing import Dict, Optional, Tuple
+
+from src.config import SPOOL_DIR
+from src.utils.helpers import iso_week_label
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE = "index.json"
+
+
+class RenderSpool:
+    """
+    On-disk spool of pre-rendered weekly tables, one directory per ISO week.
+    Images are stored once per content key; index.json maps every staged user
+    to (content_key, lang_code, weeks_passed, quote) and is written last, so a
+    week only counts as staged once the whole pass has finished.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self._index_cache = {}
+
+    def _week_dir(self, day: date) -> str:
+        return os.path.join(self.root, iso_week_label(day))
+
+    def _write_atomic(self, path: str, data: bytes) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def put_image(self, day: date, key: str, data: bytes) -> None:
+        self._write_atomic(os.path.join(self._week_dir(day), f"{key}.img"), data)
+
+    def get_image(self, day: date, key: str) -> Optional[bytes]:
+        try:
+            with open(os.path.join(self._week_dir(day), f"{key}.img"), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logger.error(f"Error reading spooled image {key}: {e}")
+            return None
+
+    def write_index(self, day: date, index: Dict[int, Tuple[str, str, int, str]]) -> None:
+        """Marks the week as staged. `index` maps telegram_id to (content_key, lang_code, weeks_passed, quote)."""
+        payload = {str(user_id): list(entry) for user_id, entry in index.items()}
+        self._write_atomic(os.path.join(self._week_dir(day), INDEX_FILE), json.dumps(payload).encode("utf-8"))
+        self._index_cache.pop(self._week_dir(day), None)
+
+    def get_index(self, day: date) -> Dict[int, Tuple[str, str, int, str]]:
+        """Returns the staged users of the week, empty if the week has not been staged."""
+        week_dir = self._week_dir(day)
+        index = self._index_cache.get(week_dir)
+        if index is not None:
+            return index
+        try:
+            with open(os.path.join(week_dir, INDEX_FILE), encoding="utf-8") as f:
+                index = {int(user_id): tuple(entry) for user_id, entry in json.load(f).items()}
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.error(f"Error reading spool index of {week_dir}: {e}")
+            return {}
+        self._index_cache[week_dir] = index
+        return index
+
+    def prune(self, keep_day: date) -> None:
+        """Deletes the spools of all weeks other than the one of `keep_day`."""
+        keep = os.path.basename(self._week_dir(keep_day))
+        try:
+            with os.scandir(self.root) as it:
+                for entry in it:
+                    if entry.is_dir() and entry.name != keep:
+                        shutil.rmtree(entry.path, ignore_errors=True)
+                        self._index_cache.pop(entry.path, None)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.error(f"Error pruning render spool: {e}")
+
+
+# Shared by the pre-staging and the sending job.
+render_spool = RenderSpool(SPOOL_DIR)
@@ -0,0 +1,206 @@
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, List
+
+# Stages of a weekly run: reading users (and their ledger entries), painting an
+# image, encoding it, the Telegram send call, and writing the ledger/checkpoint.
+STAGES = ("fetch", "render", "encode", "upload", "db")
+
+# Upper bounds in seconds of the histogram buckets; a last, unbounded bucket catches the rest.
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Seconds between two published snapshots of a running run
+PUBLISH_INTERVAL = 5.0
+
+
+class Histogram:
+    """Fixed-bucket histogram of durations in seconds."""
+
+    __slots__ = ("counts", "count", "sum", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile (the maximum for the last bucket)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "max": round(self.max, 6),
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "buckets": list(self.counts),
+        }
+
+
+class RunMetrics:
+    """
+    Stage timings and progress of one weekly run. `publish` is called with a
+    snapshot() at most every PUBLISH_INTERVAL seconds while the run goes on,
+    and once more when it finishes, so other processes can follow it.
+    """
+
+    def __init__(self, name: str, total: int, publish: Callable[[dict], None] = None):
+        self.name = name
+        self.total = total
+        self.started = time.time()
+        self.stages = {stage: Histogram() for stage in STAGES}
+        self.sent = 0
+        self.failed = 0
+        self.skipped = 0
+        self.errors = Counter()
+        self.finished = False
+        self._publish = publish
+        self._published = 0.0
+
+    def observe(self, stage: str, seconds: float) -> None:
+        self.stages[stage].observe(seconds)
+
+    @contextmanager
+    def timed(self, stage: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    def record_sent(self) -> None:
+        self.sent += 1
+        self.maybe_publish()
+
+    def record_error(self, error: Exception) -> None:
+        self.failed += 1
+        self.errors[type(error).__name__] += 1
+        self.maybe_publish()
+
+    def record_skipped(self, count: int) -> None:
+        self.skipped += count
+
+    @property
+    def processed(self) -> int:
+        return self.sent + self.failed + self.skipped
+
+    def snapshot(self) -> dict:
+        elapsed = max(time.time() - self.started, 1e-9)
+        rate = (self.sent + self.failed) / elapsed
+        remaining = max(self.total - self.processed, 0)
+        return {
+            "name": self.name,
+            "started": datetime.fromtimestamp(self.started).isoformat(timespec="seconds"),
+            "updated": datetime.now().isoformat(timespec="seconds"),
+            "finished": self.finished,
+            "elapsed": round(elapsed, 1),
+            "total": self.total,
+            "processed": self.processed,
+            "sent": self.sent,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "errors": dict(self.errors),
+            "rate": round(rate, 2),
+            "eta": None if self.finished or not rate else round(remaining / rate, 1),
+            "stages": {stage: histogram.to_dict() for stage, histogram in self.stages.items()},
+        }
+
+    def maybe_publish(self, force: bool = False) -> None:
+        now = time.monotonic()
+        if self._publish and (force or now - self._published >= PUBLISH_INTERVAL):
+            self._published = now
+            self._publish(self.snapshot())
+
+    def finish(self) -> None:
+        self.finished = True
+        self.maybe_publish(force=True)
+
+
+def format_progress(snapshot: dict) -> str:
+    """One run's snapshot as a few lines of Markdown for the admin panel."""
+    state = "finished" if snapshot["finished"] else "running"
+    eta = f", ETA {snapshot['eta'] / 60:.1f} min" if snapshot.get("eta") is not None else ""
+    lines = [
+        f"*{snapshot['name']}* ({state}, updated {snapshot['updated']})",
+        f"- Progress: {snapshot['processed']}/{snapshot['total']} "
+        f"(sent {snapshot['sent']}, failed {snapshot['failed']}, skipped {snapshot['skipped']})",
+        f"- Rate: {snapshot['rate']:.1f} users/s{eta}",
+    ]
+    if snapshot["errors"]:
+        lines.append("- Errors: " + ", ".join(f"{name} {count}" for name, count in snapshot["errors"].items()))
+    for stage, histogram in snapshot["stages"].items():
+        if histogram["count"]:
+            lines.append(
+                f"- `{stage}`: n={histogram['count']} p50≤{histogram['p50'] * 1000:.0f}ms "
+                f"p95≤{histogram['p95'] * 1000:.0f}ms max {histogram['max'] * 1000:.0f}ms"
+            )
+    return "\n".join(lines)
+
+
+def to_prometheus(snapshots: List[dict]) -> str:
+    """Renders run snapshots in the Prometheus text exposition format."""
+    lines = [
+        "# HELP weekly_update_users Users of a weekly update run, by state.",
+        "# TYPE weekly_update_users gauge",
+    ]
+    for snapshot in snapshots:
+        run = _label(snapshot["name"])
+        for state in ("total", "processed", "sent", "failed", "skipped"):
+            lines.append(f'weekly_update_users{{run="{run}",state="{state}"}} {snapshot[state]}')
+    lines += ["# HELP weekly_update_errors Failed sends of a weekly update run, by error.", "# TYPE weekly_update_errors gauge"]
+    for snapshot in snapshots:
+        run = _label(snapshot["name"])
+        for error, count in snapshot["errors"].items():
+            lines.append(f'weekly_update_errors{{run="{run}",error="{_label(error)}"}} {count}')
+    lines += [
+        "# HELP weekly_update_rate Users per second of a weekly update run.",
+        "# TYPE weekly_update_rate gauge",
+    ]
+    for snapshot in snapshots:
+        lines.append(f'weekly_update_rate{{run="{_label(snapshot["name"])}"}} {snapshot["rate"]}')
+    lines += [
+        "# HELP weekly_update_eta_seconds Estimated seconds left of a running weekly update.",
+        "# TYPE weekly_update_eta_seconds gauge",
+    ]
+    for snapshot in snapshots:
+        if snapshot.get("eta") is not None:
+            lines.append(f'weekly_update_eta_seconds{{run="{_label(snapshot["name"])}"}} {snapshot["eta"]}')
+    lines += [
+        "# HELP weekly_update_stage_seconds Duration of each stage of a weekly update run.",
+        "# TYPE weekly_update_stage_seconds histogram",
+    ]
+    for snapshot in snapshots:
+        run = _label(snapshot["name"])
+        for stage, histogram in snapshot["stages"].items():
+            labels = f'run="{run}",stage="{stage}"'
+            cumulative = 0
+            for bound, count in zip(BUCKETS + (float("inf"),), histogram["buckets"]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'weekly_update_stage_seconds_bucket{{{labels},le="{le}"}} {cumulative}')
+            lines.append(f"weekly_update_stage_seconds_sum{{{labels}}} {histogram['sum']}")
+            lines.append(f"weekly_update_stage_seconds_count{{{labels}}} {histogram['count']}")
+    return "\n".join(lines) + "\n"
+
+
+def _label(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
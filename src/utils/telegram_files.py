@@ -0,0 +1,92 @@
+import logging
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Optional
+
+from telegram import Message
+from telegram.error import BadRequest
+
+from src.database.stats_repository import StatsRepository
+
+logger = logging.getLogger(__name__)
+stats_repo = StatsRepository()
+
+FILE_ID_KEY_PREFIX = "file_id:"
+# Weeks a stored file_id is kept. Render keys include the weeks lived (and in weekly
+# quote mode the quote of the week), so most keys are not used again a week later.
+FILE_ID_KEEP_WEEKS = 2
+
+# In-process mirror of the file_ids stored in the bot_data table.
+_file_ids = {}
+
+
+def get_cached_file_id(content_key: str, lookup: bool = True) -> Optional[str]:
+    """
+    Returns the Telegram file_id of an already uploaded render, if there is one.
+    Without `lookup` only the in-process mirror is asked, e.g. after load_file_ids().
+    """
+    file_id = _file_ids.get(content_key)
+    if file_id is None and lookup:
+        file_id = stats_repo.get_bot_data(FILE_ID_KEY_PREFIX + content_key)
+        if file_id:
+            _file_ids[content_key] = file_id
+    return file_id
+
+
+def load_file_ids(keep_weeks: int = FILE_ID_KEEP_WEEKS) -> int:
+    """
+    Deletes the file_ids stored more than `keep_weeks` ago and replaces the in-process
+    mirror with the remaining ones, in one query. Returns the number of loaded file_ids.
+    """
+    pruned = stats_repo.delete_bot_data_by_prefix(FILE_ID_KEY_PREFIX, datetime.utcnow() - timedelta(weeks=keep_weeks))
+    if pruned:
+        logger.info(f"Pruned {pruned} file_id(s) older than {keep_weeks} weeks")
+    stored = stats_repo.get_bot_data_by_prefix(FILE_ID_KEY_PREFIX)
+    _file_ids.clear()
+    _file_ids.update(
+        (key[len(FILE_ID_KEY_PREFIX):], file_id) for key, file_id in stored.items() if isinstance(file_id, str)
+    )
+    return len(_file_ids)
+
+
+def remember_file_id(content_key: str, message: Message) -> Optional[str]:
+    """Stores the file_id Telegram assigned to the largest size of an uploaded photo."""
+    if not message or not message.photo:
+        return None
+    file_id = message.photo[-1].file_id
+    _file_ids[content_key] = file_id
+    stats_repo.set_bot_data(FILE_ID_KEY_PREFIX + content_key, file_id)
+    return file_id
+
+
+def forget_file_id(content_key: str) -> None:
+    _file_ids.pop(content_key, None)
+    stats_repo.delete_bot_data(FILE_ID_KEY_PREFIX + content_key)
+
+
+async def send_cached_photo(
+    send_photo: Callable[..., Awaitable[Message]],
+    content_key: str,
+    render: Callable[[], Awaitable[bytes]],
+    lookup: bool = True,
+    **kwargs
+) -> Message:
+    """
+    Sends a photo through `send_photo` (e.g. `bot.send_photo` or `message.reply_photo`),
+    reusing the file_id of an earlier upload with the same content key. `render` is
+    only awaited when the image actually has to be uploaded; its bytes are uploaded
+    as they are, without another copy. `lookup` is passed to get_cached_file_id.
+    """
+    file_id = get_cached_file_id(content_key, lookup)
+    if file_id:
+        try:
+            return await send_photo(photo=file_id, **kwargs)
+        except BadRequest as e:
+            if "file" not in str(e).lower():
+                raise
+            # The file_id is no longer valid for this bot, upload the bytes again.
+            logger.warning(f"Cached file_id for {content_key} was rejected: {e}")
+            forget_file_id(content_key)
+
+    message = await send_photo(photo=await render(), **kwargs)
+    remember_file_id(content_key, message)
+    return message
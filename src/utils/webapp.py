@@ -0,0 +1,71 @@
+import hashlib
+import hmac
+import json
+import time
+from datetime import datetime
+from typing import Optional
+from urllib.parse import parse_qsl
+
+from . import localization
+from .helpers import calculate_weeks_passed
+from .image_generator import COLORS, choose_quote
+from .life_grid import LifeGrid
+
+# initData older than this is rejected, so a leaked one cannot be replayed forever.
+INIT_DATA_MAX_AGE = 24 * 60 * 60
+
+
+def validate_init_data(init_data: str, bot_token: str, max_age: int = INIT_DATA_MAX_AGE) -> Optional[dict]:
+    """
+    Checks the signature Telegram puts on a Mini App's initData and returns the
+    user it was issued for, or None if it is missing, forged or expired.
+    """
+    if not init_data or not bot_token:
+        return None
+    fields = dict(parse_qsl(init_data, keep_blank_values=True))
+    received_hash = fields.pop("hash", None)
+    if not received_hash:
+        return None
+
+    data_check_string = "\n".join(f"{key}={value}" for key, value in sorted(fields.items()))
+    secret_key = hmac.new(b"WebAppData", bot_token.encode(), hashlib.sha256).digest()
+    expected_hash = hmac.new(secret_key, data_check_string.encode(), hashlib.sha256).hexdigest()
+    if not hmac.compare_digest(expected_hash, received_hash):
+        return None
+
+    try:
+        if max_age and time.time() - int(fields.get("auth_date", 0)) > max_age:
+            return None
+        return json.loads(fields.get("user", "null"))
+    except ValueError:
+        return None
+
+
+def life_table_payload(birthday: datetime, lang_code: str) -> dict:
+    """Everything the Mini App needs to draw the table itself: the packed grid, colours and strings."""
+    def get_text(key: str) -> str:
+        return localization.get_text(key, lang_code)
+
+    weeks_passed = calculate_weeks_passed(birthday)
+    return {
+        "birthday": birthday.date().isoformat(),
+        "weeks_passed": weeks_passed,
+        "days_passed": (datetime.now() - birthday).days,
+        "grid": LifeGrid.from_weeks(weeks_passed).to_dict(),
+        "colors": COLORS,
+        "quote": choose_quote(localization.QUOTES, lang_code),
+        "strings": {
+            "title": get_text("image_title"),
+            "x_axis": get_text("x_axis_label"),
+            "y_axis": get_text("y_axis_label"),
+            "weeks_passed": get_text("table_text_details.weeks_passed").format(weeks=weeks_passed),
+            "legend": {
+                "childhood_adolescence": f"0-17 ({get_text('legend_childhood_adolescence')})",
+                "young_adulthood": f"18-39 ({get_text('legend_young_adulthood')})",
+                "middle_age": f"40-64 ({get_text('legend_middle_age')})",
+                "seniority": f"65-90 ({get_text('legend_seniority')})",
+                "current_week": get_text("legend_current"),
+                "future": get_text("legend_future"),
+            },
+        },
+    }
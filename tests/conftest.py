@@ -0,0 +1,36 @@
+import os
+import tempfile
+
+# Read by src.config on import: no throttling, renders in a thread, and never
+# the real database or cache directories
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("SEND_RATE", "10000")
+os.environ.setdefault("SEND_CHAT_INTERVAL", "0")
+os.environ.setdefault("RENDER_WORKERS", "0")
+os.environ.setdefault("SPOOL_DIR", os.path.join(tempfile.mkdtemp(), "spool"))
+
+import pytest
+
+from src.database import database
+from src.database.models import User
+from src.utils import localization, telegram_files
+from src.utils.dry_run import seed_users
+
+localization.LOCALES, localization.QUOTES = localization.load_locales()
+
+
+@pytest.fixture
+def db(tmp_path):
+    """A fresh sqlite database for one test, with no file_ids remembered from another."""
+    database.configure_database(f"sqlite:///{tmp_path / 'test.db'}")
+    database.init_database()
+    telegram_files._file_ids.clear()
+    yield database
+
+
+@pytest.fixture
+def users(db):
+    """Seeds 120 active users and returns their telegram_ids in row order."""
+    seed_users(120)
+    with db.DatabaseSession() as session:
+        return [telegram_id for telegram_id, in session.query(User.telegram_id).order_by(User.id)]
@@ -0,0 +1,217 @@
+import asyncio
+from collections import Counter
+from functools import partial
+
+import pytest
+from telegram.error import Forbidden, NetworkError
+
+from src import broadcasts
+from src.database.models import BroadcastRecipient, User
+from src.utils.rate_limit import SendLimiter
+from src.database.broadcast_repository import (
+    BroadcastRepository, RUNNING, PAUSED, CANCELLED, FINISHED, SENT, FAILED, SEND_ATTEMPTS
+)
+
+
+class FakeBot:
+    """Counts copied messages per chat; `on_send` may raise or change the broadcast."""
+
+    def __init__(self, on_send=None):
+        self.calls = Counter()
+        self.on_send = on_send
+
+    async def copy_message(self, chat_id, **kwargs):
+        await asyncio.sleep(0.001)
+        self.calls[chat_id] += 1
+        if self.on_send:
+            await self.on_send(chat_id, self.calls)
+
+    async def edit_message_text(self, **kwargs):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def small_batches(monkeypatch):
+    monkeypatch.setattr(broadcasts, "BROADCAST_BATCH_SIZE", 40)
+    monkeypatch.setattr(broadcasts, "RECIPIENT_FLUSH_SIZE", 10)
+    monkeypatch.setattr(broadcasts, "RETRY_DELAY", 0)
+    # Network errors reach the run at once instead of after the limiter's own retries
+    monkeypatch.setattr(broadcasts, "SendLimiter", partial(SendLimiter, network_retries=0))
+
+
+def create(users) -> int:
+    return BroadcastRepository.create(1, 2, len(users))
+
+
+async def wait_stopped(broadcast_id: int) -> dict:
+    for _ in range(500):
+        await asyncio.sleep(0.01)
+        if broadcast_id not in broadcasts._runs:
+            break
+    return BroadcastRepository.get(broadcast_id)
+
+
+def recipient_statuses(db, broadcast_id: int) -> Counter:
+    with db.DatabaseSession() as session:
+        rows = session.query(BroadcastRecipient.status).filter(
+            BroadcastRecipient.broadcast_id == broadcast_id
+        ).all()
+    return Counter(status for status, in rows)
+
+
+def test_sends_every_user_once(db, users):
+    bot = FakeBot()
+
+    async def main():
+        broadcast_id = create(users)
+        assert broadcasts.start_broadcast(bot, broadcast_id)
+        return await wait_stopped(broadcast_id)
+
+    broadcast = asyncio.run(main())
+    assert broadcast["status"] == FINISHED
+    assert broadcast["sent"] == len(users)
+    assert set(bot.calls) == set(users)
+    assert max(bot.calls.values()) == 1
+
+
+def test_pause_and_resume_within_one_batch(db, users):
+    state = {}
+
+    async def pause_and_resume(chat_id, calls):
+        # Paused and resumed while the other workers are still draining the batch
+        if sum(calls.values()) == 5:
+            broadcasts.set_broadcast_status(bot, state["id"], PAUSED)
+            await asyncio.sleep(0.05)
+            broadcasts.set_broadcast_status(bot, state["id"], RUNNING)
+
+    bot = FakeBot(pause_and_resume)
+
+    async def main():
+        state["id"] = create(users)
+        broadcasts.start_broadcast(bot, state["id"])
+        return await wait_stopped(state["id"])
+
+    broadcast = asyncio.run(main())
+    assert broadcast["status"] == FINISHED
+    assert broadcast["sent"] == len(users)
+    assert set(bot.calls) == set(users)
+    assert max(bot.calls.values()) == 1
+
+
+def test_paused_broadcast_keeps_its_cursor(db, users):
+    state = {}
+    paused_calls = set()
+
+    async def pause(chat_id, calls):
+        if sum(calls.values()) == 50:
+            broadcasts.set_broadcast_status(bot, state["id"], PAUSED)
+
+    bot = FakeBot(pause)
+
+    async def main():
+        state["id"] = create(users)
+        broadcasts.start_broadcast(bot, state["id"])
+        paused = await wait_stopped(state["id"])
+        paused_calls.update(bot.calls)
+        bot.on_send = None
+        broadcasts.set_broadcast_status(bot, state["id"], RUNNING)
+        return paused, await wait_stopped(state["id"])
+
+    paused, broadcast = asyncio.run(main())
+    assert paused["status"] == PAUSED
+    assert paused["sent"] < len(users)
+    # Every user up to the cursor (row ids start at 1) was sent to before the pause
+    assert paused["after_user_id"] > 0
+    assert set(users[:paused["after_user_id"]]) <= paused_calls
+    assert broadcast["status"] == FINISHED
+    assert broadcast["sent"] == len(users)
+    assert max(bot.calls.values()) == 1
+
+
+def test_restart_does_not_send_twice(db, users):
+    bot = FakeBot()
+
+    async def main():
+        broadcast_id = create(users)
+        broadcasts.start_broadcast(bot, broadcast_id)
+        while sum(bot.calls.values()) < 60:
+            await asyncio.sleep(0.001)
+        # The process stops mid-batch, a new one resumes the running broadcast
+        run = broadcasts._runs[broadcast_id]
+        run.task.cancel()
+        await asyncio.gather(run.task, return_exceptions=True)
+        assert BroadcastRepository.get(broadcast_id)["status"] == RUNNING
+        assert broadcasts.resume_broadcasts(bot) == 1
+        return await wait_stopped(broadcast_id)
+
+    broadcast = asyncio.run(main())
+    assert broadcast["status"] == FINISHED
+    assert set(bot.calls) == set(users)
+    assert max(bot.calls.values()) == 1
+
+
+def test_transient_failures_are_retried(db, users):
+    flaky, broken = users[3], users[70]
+
+    async def fail(chat_id, calls):
+        if chat_id == broken or (chat_id == flaky and calls[chat_id] == 1):
+            raise NetworkError("connection reset")
+
+    bot = FakeBot(fail)
+
+    async def main():
+        broadcast_id = create(users)
+        broadcasts.start_broadcast(bot, broadcast_id)
+        return await wait_stopped(broadcast_id)
+
+    broadcast = asyncio.run(main())
+    assert broadcast["status"] == FINISHED
+    assert bot.calls[flaky] == 2
+    assert bot.calls[broken] == SEND_ATTEMPTS
+    assert broadcast["sent"] == len(users) - 1
+    assert broadcast["failed"] == 1
+    assert recipient_statuses(db, broadcast["id"]) == Counter({SENT: len(users) - 1, FAILED: 1})
+
+
+def test_unreachable_users_are_not_retried(db, users):
+    blocked = users[10]
+
+    async def block(chat_id, calls):
+        if chat_id == blocked:
+            raise Forbidden("bot was blocked by the user")
+
+    bot = FakeBot(block)
+
+    async def main():
+        broadcast_id = create(users)
+        broadcasts.start_broadcast(bot, broadcast_id)
+        return await wait_stopped(broadcast_id)
+
+    broadcast = asyncio.run(main())
+    assert bot.calls[blocked] == 1
+    assert broadcast["failed"] == 1
+    with db.DatabaseSession() as session:
+        user = session.query(User).filter(User.telegram_id == blocked).one()
+        assert not user.is_active
+
+
+def test_cancelled_broadcast_does_not_resume(db, users):
+    state = {}
+
+    async def cancel(chat_id, calls):
+        if sum(calls.values()) == 20:
+            broadcasts.set_broadcast_status(bot, state["id"], CANCELLED)
+
+    bot = FakeBot(cancel)
+
+    async def main():
+        state["id"] = create(users)
+        broadcasts.start_broadcast(bot, state["id"])
+        await wait_stopped(state["id"])
+        assert not broadcasts.set_broadcast_status(bot, state["id"], RUNNING)
+        assert broadcasts.resume_broadcasts(bot) == 0
+        return BroadcastRepository.get(state["id"])
+
+    broadcast = asyncio.run(main())
+    assert broadcast["status"] == CANCELLED
+    assert sum(bot.calls.values()) < len(users)
@@ -0,0 +1,26 @@
+import asyncio
+import os
+import signal
+from datetime import datetime
+
+from src.utils.render_service import RenderService
+
+
+def test_pool_is_replaced_after_a_worker_dies():
+    service = RenderService(workers=1, queue_size=2)
+
+    async def main():
+        first = await service.render(datetime(1990, 1, 1), "en", "before the crash")
+        executor = service._executor
+        for process in list(executor._processes.values()):
+            os.kill(process.pid, signal.SIGKILL)
+        second = await service.render(datetime(1990, 1, 1), "en", "after the crash")
+        return first, second, executor, service._executor
+
+    try:
+        first, second, broken, replaced = asyncio.run(main())
+    finally:
+        service.shutdown()
+    assert first.startswith(b"\x89PNG") and second.startswith(b"\x89PNG")
+    assert service.rendered == 2
+    assert replaced is not broken
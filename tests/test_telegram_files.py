@@ -0,0 +1,23 @@
+from datetime import datetime, timedelta
+
+from src.database.models import BotData
+from src.utils import telegram_files
+from src.utils.telegram_files import FILE_ID_KEY_PREFIX, get_cached_file_id, load_file_ids
+
+
+def test_old_file_ids_are_pruned_and_the_rest_loaded(db, monkeypatch):
+    lookups = []
+    monkeypatch.setattr(telegram_files.stats_repo, "get_bot_data", lambda key: lookups.append(key))
+    with db.DatabaseSession() as session:
+        session.add(BotData(key=FILE_ID_KEY_PREFIX + "new", value="file-new"))
+        session.add(BotData(
+            key=FILE_ID_KEY_PREFIX + "old", value="file-old", updated_at=datetime.utcnow() - timedelta(weeks=3)
+        ))
+        session.add(BotData(key="weekly_update_checkpoint", value="{}", updated_at=datetime.utcnow() - timedelta(weeks=3)))
+
+    assert load_file_ids(keep_weeks=2) == 1
+    assert get_cached_file_id("new", lookup=False) == "file-new"
+    assert get_cached_file_id("old", lookup=False) is None
+    assert not lookups
+    with db.DatabaseSession() as session:
+        assert {key for key, in session.query(BotData.key)} == {FILE_ID_KEY_PREFIX + "new", "weekly_update_checkpoint"}
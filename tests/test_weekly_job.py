@@ -0,0 +1,183 @@
+import asyncio
+from collections import Counter
+from datetime import date, datetime, timedelta
+from functools import partial
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy.exc import OperationalError
+from telegram.error import Forbidden
+
+from src import jobs
+from src.database.models import DeadLetter, User
+from src.database.shard_lease_repository import ShardLeaseRepository
+from src.database.user_repository import UserRepository, delivery_slot
+from src.utils import telegram_files
+from src.utils.helpers import iso_week_label
+from src.utils.render_service import render_service
+from src.utils.render_spool import render_spool
+
+WEEK = iso_week_label(date.today())
+
+
+class FakeBot:
+    """Counts photos per chat and keeps their captions; `on_send` may raise to fail a send."""
+
+    def __init__(self, on_send=None):
+        self.calls = Counter()
+        self.captions = {}
+        self.on_send = on_send
+
+    async def send_photo(self, chat_id, caption=None, **kwargs):
+        if self.on_send:
+            self.on_send(chat_id, self.calls)
+        await asyncio.sleep(0)
+        self.calls[chat_id] += 1
+        self.captions[chat_id] = caption
+        return SimpleNamespace(photo=[SimpleNamespace(file_id=f"file{chat_id}")])
+
+
+@pytest.fixture
+def users(db, monkeypatch):
+    """600 users with a few distinct tables, so renders stay cheap. Returns their telegram_ids."""
+    monkeypatch.setattr(jobs, "_weekly_update_lock", asyncio.Lock())
+    monkeypatch.setattr(jobs, "_user_batches", partial(jobs._user_batches, 100))
+    monkeypatch.setattr(jobs, "LEDGER_FLUSH_SIZE", 10)
+    with db.DatabaseSession() as session:
+        session.add_all(
+            User(telegram_id=1000 + i, language="en", birthday=datetime(1980 + i % 3, 5, 1), is_active=True)
+            for i in range(600)
+        )
+    return [1000 + i for i in range(600)]
+
+
+def test_sends_every_user_once(users):
+    bot = FakeBot()
+    assert asyncio.run(jobs.send_weekly_update(bot)) == (len(users), len(users))
+    assert set(bot.calls) == set(users)
+    assert max(bot.calls.values()) == 1
+
+
+def test_repeated_run_sends_nothing(users):
+    bot = FakeBot()
+    asyncio.run(jobs.send_weekly_update(bot))
+    assert asyncio.run(jobs.send_weekly_update(bot)) == (len(users), len(users))
+    assert sum(bot.calls.values()) == len(users)
+
+
+def test_resume_after_a_crash_does_not_send_twice(users):
+    bot = FakeBot()
+
+    async def crash():
+        run = asyncio.create_task(jobs.send_weekly_update(bot))
+        while sum(bot.calls.values()) < 250:
+            await asyncio.sleep(0)
+        run.cancel()
+        await asyncio.gather(run, return_exceptions=True)
+
+    asyncio.run(crash())
+    checkpoint = jobs.stats_repo.get_bot_data(jobs.WEEKLY_CHECKPOINT_KEY)
+    assert checkpoint["week"] == WEEK and checkpoint["after_id"] > 0
+    assert sum(bot.calls.values()) < len(users)
+
+    assert asyncio.run(jobs.send_weekly_update(bot)) == (len(users), len(users))
+    assert set(bot.calls) == set(users)
+    assert max(bot.calls.values()) == 1
+
+
+def test_checkpoint_of_another_week_is_ignored(users):
+    jobs.stats_repo.set_bot_data(
+        jobs.WEEKLY_CHECKPOINT_KEY, {"week": iso_week_label(date.today() - timedelta(weeks=1)), "after_id": 500}
+    )
+    bot = FakeBot()
+    assert asyncio.run(jobs.send_weekly_update(bot)) == (len(users), len(users))
+
+
+def test_failed_user_batch_fails_the_run(users, monkeypatch):
+    iter_users = UserRepository.iter_users_with_birthday
+
+    def failing(batch_size=1000, after_id=0, shard=None, slot=None):
+        for user in iter_users(batch_size, after_id, shard, slot):
+            if user.id > 300:
+                raise OperationalError("SELECT", {}, Exception("database is gone"))
+            yield user
+
+    bot = FakeBot()
+    monkeypatch.setattr(jobs.user_repo, "iter_users_with_birthday", failing)
+    with pytest.raises(OperationalError):
+        asyncio.run(jobs.send_weekly_update(bot))
+    assert sum(bot.calls.values()) <= 300
+
+    monkeypatch.setattr(jobs.user_repo, "iter_users_with_birthday", iter_users)
+    assert asyncio.run(jobs.send_weekly_update(bot)) == (len(users), len(users))
+    assert max(bot.calls.values()) == 1
+
+
+def test_unreachable_users_are_dead_lettered_and_deactivated(users, db):
+    blocked = set(users[::50])
+
+    def block(chat_id, calls):
+        if chat_id in blocked:
+            raise Forbidden("bot was blocked by the user")
+
+    asyncio.run(jobs.send_weekly_update(FakeBot(block)))
+    with db.DatabaseSession() as session:
+        dead = {telegram_id for telegram_id, in session.query(DeadLetter.telegram_id)}
+        inactive = {telegram_id for telegram_id, in session.query(User.telegram_id).filter(User.is_active == False)}
+    assert dead == inactive == blocked
+
+
+def test_slots_split_the_users(users):
+    slots = 4
+    bot = FakeBot()
+    for slot in range(slots):
+        sent, total = asyncio.run(jobs.send_weekly_update(bot, slot=(slot, slots)))
+        assert sent == total == sum(delivery_slot(user, slots) == slot for user in users)
+    assert set(bot.calls) == set(users)
+    assert max(bot.calls.values()) == 1
+
+
+def test_sharded_workers_send_every_user_once(users):
+    bot = FakeBot()
+
+    async def workers():
+        await asyncio.gather(*(jobs.run_sharded_weekly_update(bot, 3, owner=f"worker{i}") for i in range(2)))
+
+    asyncio.run(workers())
+    assert set(bot.calls) == set(users)
+    assert max(bot.calls.values()) == 1
+
+
+def test_expired_shard_lease_is_taken_over(db):
+    leases = ShardLeaseRepository()
+    assert leases.claim(WEEK, 2, "a", ttl=-1) == 0
+    assert leases.claim(WEEK, 2, "b", ttl=60) == 0
+    assert not leases.renew(WEEK, 2, 0, "a", ttl=60)
+    assert leases.claim(WEEK, 2, "a", ttl=60) == 1
+    assert leases.finish(WEEK, 2, 0, "b") and leases.finish(WEEK, 2, 1, "a")
+    assert leases.claim(WEEK, 2, "c", ttl=60) is None
+
+
+def test_file_ids_are_loaded_once_per_run(users, monkeypatch):
+    lookups = []
+    get_bot_data = telegram_files.stats_repo.get_bot_data
+    monkeypatch.setattr(
+        telegram_files.stats_repo, "get_bot_data", lambda key: lookups.append(key) or get_bot_data(key)
+    )
+    asyncio.run(jobs.send_weekly_update(FakeBot()))
+    assert not [key for key in lookups if key.startswith(telegram_files.FILE_ID_KEY_PREFIX)]
+
+
+def test_staged_image_is_sent_with_its_quote(users, monkeypatch):
+    # Like QUOTE_MODE=random: every call picks another quote
+    picks = iter(range(10**6))
+    monkeypatch.setattr(jobs, "choose_quote", lambda quotes, lang_code, day=None: f"quote {next(picks) % 7}")
+    assert asyncio.run(jobs.prestage_weekly_update(FakeBot(), date.today())) == len(users)
+    staged = render_spool.get_index(date.today())
+    rendered = render_service.rendered
+
+    bot = FakeBot()
+    asyncio.run(jobs.send_weekly_update(bot))
+    assert render_service.rendered == rendered
+    for user in users:
+        assert bot.captions[user].endswith("\n" + staged[user][3])